@@ -0,0 +1,80 @@
+//
+// Measures how fast libUncrustify.js formats a list of files: the module is
+// instantiated once and then formats every file of the list through the
+// exported API, a given number of times.
+//
+// usage: node benchmark.js <libUncrustify.js> <benchmark.json>
+//
+// benchmark.json holds an object with the "files" to format, each an object
+// with the file "path" and the name of its uncrustify.Language, the number of
+// times to "repeat" formatting them and optionally the "config" file to load.
+//
+// Prints an object with the module "instantiation" time, and for each file
+// its size in "bytes", the formatting "times" (all in seconds) and the "sha1"
+// of the formatted output.
+//
+var fs = require("fs");
+var crypto = require("crypto");
+
+function seconds(start)
+{
+    var elapsed = process.hrtime(start);
+    return elapsed[0] + elapsed[1] / 1e9;
+}
+
+exports.benchmark = function(libUncrustify, benchmark)
+{
+    var start = process.hrtime();
+    var uncrustify = libUncrustify();
+    var instantiation = seconds(start);
+
+    if (benchmark.config) {
+        uncrustify.load_config(fs.readFileSync(benchmark.config, "utf8"));
+    }
+
+    var files = benchmark.files.map(function(file) {
+        var content = fs.readFileSync(file.path);
+        return {
+            path     : file.path,
+            bytes    : content.length,
+            text     : content.toString("utf8"),
+            language : uncrustify.Language[file.language],
+            times    : [],
+            sha1     : null
+        };
+    });
+
+    for (var r = 0; r < benchmark.repeat; r++) {
+        files.forEach(function(file) {
+            var start = process.hrtime();
+            var output = uncrustify.uncrustify(file.text, file.language);
+            file.times.push(seconds(start));
+
+            if (file.sha1 === null) {
+                file.sha1 = crypto.createHash("sha1")
+                                  .update(output, "utf8").digest("hex");
+            }
+        });
+    }
+
+    uncrustify.destruct();
+
+    return {
+        instantiation : instantiation,
+        files         : files.map(function(file) {
+            return {
+                path  : file.path,
+                bytes : file.bytes,
+                times : file.times,
+                sha1  : file.sha1
+            };
+        })
+    };
+};
+
+if (module == require.main) {
+    if (process.argv.length < 4) {throw "libUncrustify.js or benchmark.json path missing";}
+    var libUncrustify = require(process.argv[2]);
+    var benchmark = JSON.parse(fs.readFileSync(process.argv[3], "utf8"));
+    process.stdout.write(JSON.stringify(exports.benchmark(libUncrustify, benchmark)));
+}
@@ -1,67 +1,380 @@
 #!/usr/bin/env python
 #
-# Rebuilds the version using git describe
+# Runs the libUncrustify.js tests (test_*.js) with node
 #
+# With --benchmark, measures how fast libUncrustify.js formats the tests/input
+# corpus instead, optionally comparing it with a native uncrustify binary
+#
+import argparse
+import hashlib
+import json
+import os
 import sys
-from subprocess import Popen
-from os import listdir, EX_OK, EX_USAGE, EX_SOFTWARE
-from os.path import isfile, isdir, abspath, basename
-from tempfile import NamedTemporaryFile
+import tempfile
+import time
+from subprocess import Popen, PIPE, STDOUT, TimeoutExpired
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from os import EX_OK, EX_USAGE, EX_SOFTWARE
+from os.path import isfile, isdir, abspath, basename, dirname, join, relpath
 from glob import glob
 
+c_red = '\033[31m'
+c_green = '\033[32m'
+c_end = '\033[0m'
 
-def main(args):
-    if len(args) < 2 or not isfile(args[0]) or not isdir(args[1]):
-        print("Usage:")
-        print("   arg 1: libUncrustify.js file path")
-        print("   arg 2: test directory path")
+root_dir = dirname(dirname(dirname(abspath(__file__))))
+
+# uncrustify language of the files in each tests/input directory; the
+# libUncrustify.js Language enum has no "OC+", so .mm files are formatted as OC
+corpus_languages = {
+    'c': 'C',
+    'cpp': 'CPP',
+    'cs': 'CS',
+    'd': 'D',
+    'ecma': 'ECMA',
+    'java': 'JAVA',
+    'oc': 'OC',
+    'pawn': 'PAWN',
+    'sql': 'C',
+    'vala': 'VALA',
+}
+
+
+class TestResult(object):
+    def __init__(self, test_file_path, returncode, output, elapsed,
+                 timed_out):
+        self.test_file_path = test_file_path
+        self.returncode = returncode
+        self.output = output
+        self.elapsed = elapsed
+        self.timed_out = timed_out
+
+    @property
+    def passed(self):
+        return self.returncode == 0 and not self.timed_out
+
+
+def run_test(test_file_path, js_file_path, timeout):
+    """
+    runs a single test file, capturing its output
+
+    :param test_file_path: path of the test_*.js file
+    :param js_file_path: path of libUncrustify.js
+    :param timeout: seconds the test may run before it is killed, or None
+    :return: TestResult
+    """
+    start = time.time()
+    process = Popen(["node", test_file_path, js_file_path],
+                    stdout=PIPE, stderr=STDOUT)
+    timed_out = False
+    try:
+        output, _ = process.communicate(timeout=timeout)
+    except TimeoutExpired:
+        process.kill()
+        output, _ = process.communicate()
+        timed_out = True
+
+    return TestResult(test_file_path, process.returncode,
+                      output.decode('utf-8', 'replace'),
+                      time.time() - start, timed_out)
+
+
+def print_result(result):
+    pt_strg = "Testing %s: " % basename(result.test_file_path)
+    time_strg = " (%.2fs)" % result.elapsed
+
+    if result.passed:
+        status = "%spassed.%s" % (c_green, c_end)
+    elif result.timed_out:
+        status = "%stimed out!%s" % (c_red, c_end)
+    else:
+        status = "%sfailed!%s" % (c_red, c_end)
+
+    # the color codes take up 9 characters
+    print(pt_strg + (status + time_strg).rjust(89 - len(pt_strg)))
+
+    if not result.passed:
+        print(result.output)
+
+
+def collect_corpus(corpus_dir):
+    """
+    lists the files of the corpus, with the language to format them as
+
+    :param corpus_dir: directory with one sub directory per language, like
+                       tests/input
+    :return: list of (path, language name) tuples, sorted by path
+    """
+    files = []
+    for lang_dir in sorted(os.listdir(corpus_dir)):
+        language = corpus_languages.get(lang_dir)
+        if language is None:
+            continue
+        for path in sorted(glob(join(corpus_dir, lang_dir, '*'))):
+            if isfile(path):
+                files.append((path, language))
+    return files
+
+
+def benchmark_js(js_file_path, test_files_dir, files, config, repeat):
+    """
+    formats the files with libUncrustify.js, in a single node process
+
+    :return: the result object printed by benchmark.js
+    """
+    fd, benchmark_path = tempfile.mkstemp(suffix='.json')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump({
+                'files': [{'path': p, 'language': l} for p, l in files],
+                'config': config,
+                'repeat': repeat,
+            }, f)
+
+        process = Popen(["node", join(test_files_dir, "benchmark.js"),
+                         js_file_path, benchmark_path],
+                        stdout=PIPE, stderr=PIPE)
+        output, error = process.communicate()
+    finally:
+        os.remove(benchmark_path)
+
+    if process.returncode != 0:
+        raise RuntimeError(error.decode('utf-8', 'replace'))
+    return json.loads(output.decode('utf-8'))
+
+
+def time_native(executable, config, path, language):
+    """
+    formats a file with one run of the native binary
+
+    :return: (elapsed seconds, sha1 of the output)
+    """
+    start = time.time()
+    process = Popen([executable, '-q', '-c', config, '-l', language,
+                     '-f', path], stdout=PIPE, stderr=PIPE)
+    output, _ = process.communicate()
+    elapsed = time.time() - start
+    return elapsed, hashlib.sha1(output).hexdigest()
+
+
+def benchmark_native(executable, files, config, repeat):
+    """
+    formats the files with the native binary, one process per file and run
+
+    The startup time of the binary, measured by formatting an empty file, is
+    subtracted from the time of each run, so that only the formatting itself
+    is compared with libUncrustify.js.
+
+    :return: (startup seconds, {path: (best seconds, sha1 of the output)})
+    """
+    config = config or os.devnull
+    startup = min(time_native(executable, config, os.devnull, 'C')[0]
+                  for _ in range(repeat))
+
+    results = {}
+    for path, language in files:
+        runs = [time_native(executable, config, path, language)
+                for _ in range(repeat)]
+        results[path] = (max(0.0, min(t for t, _ in runs) - startup),
+                         runs[0][1])
+    return startup, results
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def mb_per_s(size, elapsed):
+    return size / elapsed / 1e6 if elapsed > 0 else float('inf')
+
+
+def print_benchmark(js_result, native_startup, native_results, verbose):
+    files = js_result['files']
+    print("libUncrustify.js instantiation: %8.2f ms"
+          % (js_result['instantiation'] * 1e3))
+    if native_results is not None:
+        print("native startup:                 %8.2f ms "
+              "(subtracted from the native times)" % (native_startup * 1e3))
+    print('-' * 80)
+
+    # per language and overall totals, of the best time of each file
+    rows = {}
+    order = []
+    mismatches = []
+    for f in files:
+        language = basename(dirname(f['path']))
+        if language not in rows:
+            rows[language] = [0, 0, 0.0, 0.0]
+            order.append(language)
+        f['best'] = min(f['times'])
+        row = rows[language]
+        row[0] += 1
+        row[1] += f['bytes']
+        row[2] += f['best']
+        if native_results is not None:
+            native_time, native_sha1 = native_results[f['path']]
+            row[3] += native_time
+            if native_sha1 != f['sha1']:
+                mismatches.append(f['path'])
+
+    order.append('total')
+    rows['total'] = [sum(r[i] for r in rows.values()) for i in range(4)]
+
+    if native_results is None:
+        print("%-10s %6s %10s %10s %10s"
+              % ('language', 'files', 'bytes', 'wasm ms', 'wasm MB/s'))
+        for language in order:
+            n, size, js_time, _ = rows[language]
+            print("%-10s %6d %10d %10.2f %10.2f"
+                  % (language, n, size, js_time * 1e3,
+                     mb_per_s(size, js_time)))
+    else:
+        print("%-10s %6s %10s %10s %10s %10s %10s %7s"
+              % ('language', 'files', 'bytes', 'wasm ms', 'native ms',
+                 'wasm MB/s', 'nat. MB/s', 'ratio'))
+        for language in order:
+            n, size, js_time, native_time = rows[language]
+            print("%-10s %6d %10d %10.2f %10.2f %10.2f %10.2f %6.2fx"
+                  % (language, n, size, js_time * 1e3, native_time * 1e3,
+                     mb_per_s(size, js_time), mb_per_s(size, native_time),
+                     js_time / native_time if native_time > 0 else 0))
+        print("(ratio: libUncrustify.js time / native time)")
+    print('-' * 80)
+
+    for name, times in (('wasm', [f['best'] for f in files]),
+                        ('native', [native_results[f['path']][0]
+                                    for f in files]
+                         if native_results is not None else None)):
+        if times is None:
+            continue
+        print("%-6s per-file latency: median %8.3f ms, p90 %8.3f ms, "
+              "max %8.3f ms" % (name, percentile(times, 0.5) * 1e3,
+                                percentile(times, 0.9) * 1e3,
+                                max(times) * 1e3))
+
+    if verbose:
+        print('-' * 80)
+        for f in files:
+            line = "%-50s %8d %9.3f ms" % (relpath(f['path'], root_dir),
+                                           f['bytes'], f['best'] * 1e3)
+            if native_results is not None:
+                line += " %9.3f ms" % (native_results[f['path']][0] * 1e3)
+            print(line)
+
+    if mismatches:
+        print("%sWarning%s: libUncrustify.js and the native binary formatted "
+              "%s files differently" % (c_red, c_end, len(mismatches)))
+        if verbose:
+            for path in mismatches:
+                print("  %s" % relpath(path, root_dir))
+
+
+def run_benchmark(parsed_args, js_file_path, test_files_dir):
+    corpus_dir = abspath(parsed_args.corpus)
+    files = collect_corpus(corpus_dir)
+    if len(files) == 0:
+        print("%sError%s: no input files found in %s"
+              % (c_red, c_end, corpus_dir))
         return EX_USAGE
 
-    c_red = '\033[31m'
-    c_green = '\033[32m'
-    c_end = '\033[0m'
+    config = abspath(parsed_args.config) if parsed_args.config else None
+    repeat = max(1, parsed_args.repeat)
 
-    js_file_path = args[0]
-    passed = 0
-    total = 0
+    print("Formatting %s files of %s, best of %s runs"
+          % (len(files), corpus_dir, repeat))
+    sys.stdout.flush()
 
-    test_files_dir = abspath(args[1])
-    test_files = glob(test_files_dir+"/test_*.js")
-    temp_file = NamedTemporaryFile(delete=True)
+    try:
+        js_result = benchmark_js(js_file_path, test_files_dir, files, config,
+                                 repeat)
+    except RuntimeError as e:
+        print("%sError%s: libUncrustify.js benchmark failed\n%s"
+              % (c_red, c_end, e))
+        return EX_SOFTWARE
 
-    for test_file_path in test_files:
-        total += 1
-        pt_strg = "Testing %s: " % basename(test_file_path)
-        pt_strg_len = len(pt_strg)
+    native_startup, native_results = None, None
+    if parsed_args.executable:
+        native_startup, native_results = benchmark_native(
+            abspath(parsed_args.executable), files, config, repeat)
 
-        sys.stdout.write(pt_strg)
+    print_benchmark(js_result, native_startup, native_results,
+                    parsed_args.verbose)
+    return EX_OK
 
-        with open(temp_file.name, 'r+') as t:
-            process = Popen(["node", test_file_path, js_file_path], stderr=t, stdout=t)
-            process.wait()
 
-            if process.returncode == 0:
-                print(("%spassed.%s" % (c_green, c_end)).rjust(86-pt_strg_len))
-                passed += 1
-            else:
-                print(("%sfailed!%s" % (c_red, c_end)).rjust(78-pt_strg_len))
+def main(args):
+    parser = argparse.ArgumentParser(description='Run libUncrustify.js tests')
+    parser.add_argument('js_file', help='libUncrustify.js file path')
+    parser.add_argument('test_dir', help='test directory path')
+    parser.add_argument('-j', '--jobs', type=int, default=cpu_count(),
+                        help='number of tests to run concurrently')
+    parser.add_argument('--timeout', type=float, default=300,
+                        help='seconds a test may run before it is killed '
+                             '(0 for no limit)')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='measure how fast libUncrustify.js formats the '
+                             'corpus instead of running the tests')
+    parser.add_argument('--corpus', default=join(root_dir, 'tests', 'input'),
+                        help='directory of the files to format, with one sub '
+                             'directory per language (default: tests/input)')
+    parser.add_argument('--executable',
+                        help='native uncrustify binary to compare with')
+    parser.add_argument('--config',
+                        help='config file to format with (default: none)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of times each file is formatted, the '
+                             'best time is reported')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='report the time of each benchmarked file')
+    parsed_args = parser.parse_args(args)
 
-                t.seek(0)
-                text = t.read()
-                print(text)
+    if not isfile(parsed_args.js_file) or not isdir(parsed_args.test_dir):
+        parser.print_usage()
+        return EX_USAGE
 
-    if total == 0:
+    js_file_path = abspath(parsed_args.js_file)
+    test_files_dir = abspath(parsed_args.test_dir)
+    test_files = sorted(glob(test_files_dir + "/test_*.js"))
+    timeout = parsed_args.timeout or None
+
+    if parsed_args.benchmark:
+        return run_benchmark(parsed_args, js_file_path, test_files_dir)
+
+    if len(test_files) == 0:
         print("%sError%s: no test files found in %s" % (c_red, c_end, test_files_dir))
         return EX_USAGE
 
+    passed = 0
+    total = len(test_files)
+    start = time.time()
+
+    # Tests run concurrently, but their results are reported in file order
+    pool = ThreadPool(max(1, min(parsed_args.jobs, total)))
+    try:
+        for result in pool.imap(
+                lambda path: run_test(path, js_file_path, timeout),
+                test_files):
+            print_result(result)
+            sys.stdout.flush()
+            if result.passed:
+                passed += 1
+    finally:
+        pool.close()
+        pool.join()
+
     print('-' * 80)
 
     if passed == total:
-        print("%sAll %s tests passed%s" % (c_green, total, c_end))
+        print("%sAll %s tests passed%s (%.2fs)" % (c_green, total, c_end,
+                                                   time.time() - start))
         return EX_OK
     else:
-        print("%sWarning%s: %s/%s tests passed" % (c_red, c_end, passed, total))
+        print("%sWarning%s: %s/%s tests passed (%.2fs)" % (
+            c_red, c_end, passed, total, time.time() - start))
         return EX_SOFTWARE
 
+
 if __name__ == '__main__':
     exit(main(sys.argv[1:]))
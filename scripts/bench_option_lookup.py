@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+#
+# Compares option name resolution through the perfect hash generated by
+# make_options.py with the std::unordered_map it replaced.
+#
+# Generates a stand-alone C++ program containing the option name index (with
+# stand-in option objects), compiles it and has it load a config file (by
+# default, the largest one in tests/config) many times, resolving the name of
+# every option assignment with both lookups. Only the line splitting and the
+# name resolution are timed; option values are not parsed.
+#
+
+import argparse
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from make_options import groups, read_groups, write_indexes
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+prologue = r'''
+#include <algorithm>
+#include <cctype>
+#include <chrono>
+#include <cstdint>
+#include <cstdio>
+#include <cstdlib>
+#include <fstream>
+#include <sstream>
+#include <string>
+#include <unordered_map>
+#include <vector>
+
+#include <strings.h>
+
+typedef std::uint16_t UINT16;
+typedef std::uint32_t UINT32;
+
+#define ARRAY_SIZE(x)    (sizeof(x) / sizeof((x)[0]))
+
+struct GenericOption
+{
+   const char *m_name;
+
+   const char *name() const
+   {
+      return(m_name);
+   }
+};
+
+struct option_group_index_t
+{
+   const char *description;
+   size_t     first;
+   size_t     count;
+};
+'''
+
+lookups = r'''
+static UINT32 option_name_hash(const char *name)
+{
+   UINT32 hash = 0x811c9dc5u;
+
+   for (const char *c = name; *c != 0; ++c)
+   {
+      const UINT32 ch = static_cast<unsigned char>(*c);
+
+      hash = (hash ^ ((ch >= 'A' && ch <= 'Z') ? ch + ('a' - 'A') : ch)) * 0x01000193u;
+   }
+   return(hash);
+}
+
+
+static UINT32 option_slot_hash(UINT32 hash, UINT32 seed)
+{
+   hash += seed;
+   hash ^= hash >> 16;
+   hash *= 0x85ebca6bu;
+   hash ^= hash >> 13;
+   hash *= 0xc2b2ae35u;
+   hash ^= hash >> 16;
+   return(hash);
+}
+
+
+static GenericOption *find_hashed(const std::string &name)
+{
+   const size_t size   = ARRAY_SIZE(option_name_index);
+   const auto   hash   = option_name_hash(name.c_str());
+   const auto   seed   = option_name_seeds[hash % size];
+
+   if (seed == 0)
+   {
+      return(nullptr);
+   }
+   auto *const option = option_name_index[option_slot_hash(hash, seed) % size];
+
+   if (strcasecmp(option->name(), name.c_str()) != 0)
+   {
+      return(nullptr);
+   }
+   return(option);
+}
+
+
+static std::unordered_map<std::string, GenericOption *> option_map;
+
+
+static GenericOption *find_mapped(const std::string &name)
+{
+   std::string lower(name);
+
+   std::transform(lower.begin(), lower.end(), lower.begin(), ::tolower);
+   const auto iter = option_map.find(lower);
+
+   if (iter != option_map.end())
+   {
+      return(iter->second);
+   }
+   return(nullptr);
+}
+
+
+template<typename F>
+static double run(F find, const std::vector<std::string> &lines, int loads,
+                  size_t &found)
+{
+   const auto start = std::chrono::steady_clock::now();
+
+   found = 0;
+
+   for (int l = 0; l < loads; l++)
+   {
+      for (const auto &line : lines)
+      {
+         const auto end = line.find_first_of(" \t=");
+
+         found += (find(line.substr(0, end)) != nullptr);
+      }
+   }
+   const std::chrono::duration<double> elapsed = std::chrono::steady_clock::now() - start;
+
+   return(elapsed.count());
+}
+
+
+int main(int argc, char **argv)
+{
+   const int                loads = std::atoi(argv[2]);
+   std::ifstream            in(argv[1]);
+   std::string              line;
+   std::vector<std::string> lines;
+
+   while (std::getline(in, line))
+   {
+      const auto start = line.find_first_not_of(" \t");
+
+      if (start != std::string::npos && line[start] != '#')
+      {
+         lines.push_back(line.substr(start));
+      }
+   }
+   const auto map_start = std::chrono::steady_clock::now();
+
+   for (auto *option : option_list)
+   {
+      option_map.emplace(option->name(), option);
+   }
+   const std::chrono::duration<double> map_build = std::chrono::steady_clock::now() - map_start;
+
+   size_t       found_hashed = 0;
+   size_t       found_mapped = 0;
+   const double mapped       = run(find_mapped, lines, loads, found_mapped);
+   const double hashed       = run(find_hashed, lines, loads, found_hashed);
+
+   if (found_hashed != found_mapped)
+   {
+      std::printf("MISMATCH: %zu found by hash, %zu by map\n",
+                  found_hashed, found_mapped);
+      return(1);
+   }
+   std::printf("%zu options, %zu lines, %zu names resolved per load, %d loads\n",
+               ARRAY_SIZE(option_list), lines.size(), found_hashed / loads, loads);
+   std::printf("map build %8.3f ms (once per process, now avoided)\n",
+               map_build.count() * 1e3);
+   std::printf("map       %8.3f ms %8.3f us/load\n",
+               mapped * 1e3, mapped * 1e6 / loads);
+   std::printf("hash      %8.3f ms %8.3f us/load\n",
+               hashed * 1e3, hashed * 1e6 / loads);
+   std::printf("speedup: %.2fx\n", mapped / hashed);
+   return(0);
+}
+'''
+
+
+# -----------------------------------------------------------------------------
+def largest_config():
+    config_dir = os.path.join(root, 'tests', 'config')
+    paths = [os.path.join(config_dir, n) for n in os.listdir(config_dir)]
+    return max((p for p in paths if os.path.isfile(p)), key=os.path.getsize)
+
+
+# -----------------------------------------------------------------------------
+def write_objects(out):
+    out.write(u'namespace options\n{\n\n')
+    for group in groups:
+        for option in group.options:
+            out.write(u'GenericOption {0} = {{ "{0}" }};\n'.format(
+                option.name))
+    out.write(u'\n} // namespace options\n\n')
+
+
+# -----------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark option name resolution')
+    parser.add_argument('config', metavar='CONFIG', nargs='?',
+                        help='config file to load (default: the largest '
+                             'one in tests/config)')
+    parser.add_argument('--header', type=str,
+                        default=os.path.join(root, 'src', 'options.h'),
+                        help='location of options.h to read')
+    parser.add_argument('--cxx', type=str,
+                        default=os.environ.get('CXX', 'c++'),
+                        help='C++ compiler to use')
+    parser.add_argument('--loads', type=int, default=10000, metavar='N',
+                        help='number of times to load the config')
+    args = parser.parse_args()
+
+    config = args.config or largest_config()
+    read_groups(args.header)
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        source = os.path.join(work_dir, 'bench.cpp')
+        exe = os.path.join(work_dir, 'bench')
+
+        with io.open(source, 'wt', encoding='utf-8') as out:
+            out.write(prologue)
+            out.write(u'\n')
+            write_objects(out)
+            write_indexes(out, args)
+            out.write(lookups)
+
+        subprocess.check_call([args.cxx, '-O2', '-std=c++11', '-o', exe,
+                               source])
+        print('Loading {}'.format(os.path.relpath(config, root)))
+        sys.stdout.flush()
+        return subprocess.call([exe, config, str(args.loads)])
+    finally:
+        shutil.rmtree(work_dir)
+
+
+# %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+#
+# Compares the lookup throughput of the punctuator table formats generated by
+# make_punctuator_table.py.
+#
+# Generates a stand-alone C++ program containing both tables, and a copy of
+# the corresponding find_punctuator() for each, compiles it and runs it on
+# every punctuator character of a corpus (by default, tests/input). The
+# language flags and digraph option are taken to always match.
+#
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from make_punctuator_table import read_db, scan_file, write_dense, write_linked
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+prologue = r'''
+#include <chrono>
+#include <cstdint>
+#include <cstdio>
+#include <cstdlib>
+#include <fstream>
+#include <iterator>
+#include <algorithm>
+#include <string>
+#include <vector>
+
+typedef std::uint8_t  UINT8;
+typedef std::uint16_t UINT16;
+
+struct chunk_tag_t
+{
+   const char *tag;
+};
+
+struct lookup_entry_t
+{
+   char              ch;
+   char              left_in_group;
+   UINT16            next_idx;
+   const chunk_tag_t *tag;
+
+   struct comperator
+   {
+      static char get_char(const lookup_entry_t &v)
+      {
+         return(v.ch);
+      }
+
+
+      static char get_char(char t)
+      {
+         return(t);
+      }
+
+      template<typename T1, typename T2>
+      bool operator()(T1 const &t1, T2 const &t2)
+      {
+         return(get_char(t1) < get_char(t2));
+      }
+   };
+};
+'''
+
+lookups = r'''
+static const chunk_tag_t *find_linked(const char *str)
+{
+   const auto binary_find = [](const lookup_entry_t *first, const lookup_entry_t *last, const char &value)
+   {
+      const auto tmp = std::lower_bound(first, last, value,
+                                        lookup_entry_t::comperator());
+
+      return((value == tmp->ch) ? tmp : nullptr);
+   };
+
+   const chunk_tag_t *match  = nullptr;
+   const auto        *parent = punc_table;
+   auto              ch_idx  = int{};
+
+   while (ch_idx < 6 && str[ch_idx] != '\0')
+   {
+      parent = binary_find(parent, std::next(parent, parent->left_in_group), str[ch_idx]);
+
+      if (parent == nullptr)
+      {
+         break;
+      }
+
+      if (parent->tag != nullptr)
+      {
+         match = parent->tag;
+      }
+
+      if (parent->next_idx == 0)
+      {
+         break;
+      }
+      parent = &punc_table[parent->next_idx];
+      ch_idx++;
+   }
+   return(match);
+}
+
+
+static const chunk_tag_t *find_dense(const char *str)
+{
+   const chunk_tag_t *match = nullptr;
+   size_t            state  = 0;
+
+   for (int ch_idx = 0; ch_idx < 6 && str[ch_idx] != '\0'; ch_idx++)
+   {
+      state = punc_dense_next[state][punc_dense_class[static_cast<unsigned char>(str[ch_idx])]];
+
+      if (state == 0)
+      {
+         break;
+      }
+
+      if (punc_dense_tag[state] != nullptr)
+      {
+         match = punc_dense_tag[state];
+      }
+   }
+   return(match);
+}
+
+
+template<typename F>
+static double run(F find, const std::string &text, const std::vector<size_t> &offsets,
+                  int repeat, size_t &matched)
+{
+   double best = 0;
+
+   for (int r = 0; r < repeat; r++)
+   {
+      matched = 0;
+      const auto start = std::chrono::steady_clock::now();
+
+      for (size_t offset : offsets)
+      {
+         matched += (find(text.c_str() + offset) != nullptr);
+      }
+      const std::chrono::duration<double> elapsed = std::chrono::steady_clock::now() - start;
+
+      if (r == 0 || elapsed.count() < best)
+      {
+         best = elapsed.count();
+      }
+   }
+   return(best);
+}
+
+
+int main(int argc, char **argv)
+{
+   std::ifstream     in(argv[1], std::ios::binary);
+   const std::string text((std::istreambuf_iterator<char>(in)),
+                          std::istreambuf_iterator<char>());
+   const int         repeat = std::atoi(argv[2]);
+
+   std::vector<size_t> offsets;
+
+   for (size_t i = 0; i < text.size(); i++)
+   {
+      if (punc_dense_class[static_cast<unsigned char>(text[i])] != 0)
+      {
+         offsets.push_back(i);
+      }
+   }
+
+   for (size_t offset : offsets)
+   {
+      if (find_linked(text.c_str() + offset) != find_dense(text.c_str() + offset))
+      {
+         std::printf("MISMATCH at offset %zu\n", offset);
+         return(1);
+      }
+   }
+   size_t       matched = 0;
+   const double linked  = run(find_linked, text, offsets, repeat, matched);
+   const double dense   = run(find_dense, text, offsets, repeat, matched);
+
+   std::printf("%zu bytes, %zu lookups, %zu matches\n",
+               text.size(), offsets.size(), matched);
+   std::printf("linked %8.3f ms %8.2f Mlookups/s\n",
+               linked * 1e3, offsets.size() / linked / 1e6);
+   std::printf("dense  %8.3f ms %8.2f Mlookups/s\n",
+               dense * 1e3, offsets.size() / dense / 1e6);
+   std::printf("speedup: %.2fx\n", linked / dense);
+   return(0);
+}
+'''
+
+
+# -----------------------------------------------------------------------------
+def c_string(s):
+    return '"{}"'.format(
+        s.replace('\\', '\\\\').replace('"', '\\"').replace('?', '\\?'))
+
+
+# -----------------------------------------------------------------------------
+def write_symbols(out, header):
+    tables = {}
+    for tok, ref in scan_file(header):
+        name, idx = ref[:-1].split('[')
+        tables.setdefault(name, {})[int(idx)] = tok
+
+    for name in sorted(tables):
+        entries = tables[name]
+        out.write('static const chunk_tag_t {}[] =\n{{\n'.format(name))
+        for idx in range(len(entries)):
+            out.write('   {{ {} }},\n'.format(c_string(entries[idx])))
+        out.write('};\n\n')
+
+
+# -----------------------------------------------------------------------------
+def write_corpus(out_path, paths):
+    with open(out_path, 'wb') as out:
+        for path in paths:
+            if os.path.isdir(path):
+                for dirpath, dirnames, filenames in os.walk(path):
+                    dirnames.sort()
+                    for name in sorted(filenames):
+                        with open(os.path.join(dirpath, name), 'rb') as f:
+                            out.write(f.read())
+            else:
+                with open(path, 'rb') as f:
+                    out.write(f.read())
+
+
+# -----------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark punctuator table formats')
+    parser.add_argument('inputs', metavar='PATH', nargs='*',
+                        default=[os.path.join(root, 'tests', 'input')],
+                        help='files or directories to use as the corpus '
+                             '(default: tests/input)')
+    parser.add_argument('--header', type=str,
+                        default=os.path.join(root, 'src', 'symbols_table.h'),
+                        help='location of symbols_table.h to read')
+    parser.add_argument('--cxx', type=str,
+                        default=os.environ.get('CXX', 'c++'),
+                        help='C++ compiler to use')
+    parser.add_argument('--repeat', type=int, default=20, metavar='N',
+                        help='number of runs (best is reported)')
+    args = parser.parse_args()
+
+    db = read_db(args.header)
+    work_dir = tempfile.mkdtemp()
+    try:
+        source = os.path.join(work_dir, 'bench.cpp')
+        exe = os.path.join(work_dir, 'bench')
+        corpus = os.path.join(work_dir, 'corpus')
+
+        with open(source, 'wt') as out:
+            out.write(prologue)
+            out.write('\n')
+            write_symbols(out, args.header)
+            write_linked(out, db)
+            out.write('\n')
+            write_dense(out, db)
+            out.write(lookups)
+
+        write_corpus(corpus, args.inputs)
+        subprocess.check_call([args.cxx, '-O2', '-std=c++11', '-o', exe,
+                               source])
+        return subprocess.call([exe, corpus, str(args.repeat)])
+    finally:
+        shutil.rmtree(work_dir)
+
+
+# %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,59 +13,107 @@ therefore, be fairly robust (for example, options that moved around won't show
 up). However, if an option is removed and subsequently re-added, or if an
 option was added and subsequently removed, the resulting records will need to
 be reconciled manually.
+
+The history is read with a single 'git log --raw', and the versions of
+options.h with a single 'git cat-file --batch'; each version is only parsed
+once, by a pool of worker processes.
 '''
 
 import argparse
-import git
 import os
-import re
+import subprocess
 import sys
 import time
 
-re_option = re.compile(r'extern (Bounded)?Option<[^>]+>')
-
-
-# -----------------------------------------------------------------------------
-def extract_options(repo, blob_id):
-    from git.util import hex_to_bin
+from multiprocessing import cpu_count
+from multiprocessing.pool import Pool
 
-    blob = git.Blob(repo, hex_to_bin(blob_id))
-    content = blob.data_stream.stream
-    options = set()
+from header_model import parse_options
 
-    for line in iter(content.readline, b''):
-        line = line.decode('utf-8').strip()
+null_blob = '0' * 40
 
-        if re_option.match(line):
-            line = content.readline().decode('utf-8').strip()
-            options.add(line.split(';')[0])
 
-    return options
+# -----------------------------------------------------------------------------
+def extract_options(content):
+    return set(o['name']
+               for group in parse_options(content.decode('utf-8').splitlines())
+               for o in group['options'])
 
 
 # =============================================================================
 class Changeset(object):
     # -------------------------------------------------------------------------
-    def __init__(self, repo, sha):
+    def __init__(self, sha, authored_date):
         self.sha = sha
+        self.old_blob = None
+        self.new_blob = None
         self.added_options = set()
         self.removed_options = set()
 
-        commit = repo.commit(sha)
-        ad = time.gmtime(commit.authored_date)
+        ad = time.gmtime(authored_date)
         self.date = time.strftime('%b %d %Y', ad).replace(' 0', '  ')
 
-        info = repo.git.log('-1', '--raw', '--abbrev=40', '--pretty=',
-                            sha, '--', ':src/options.h').split(' ')
-        if len(info) < 5:
+    # -------------------------------------------------------------------------
+    def compute(self, options):
+        if self.new_blob is None:
             return
 
-        old_options = extract_options(repo, info[2])
-        new_options = extract_options(repo, info[3])
+        old_options = options.get(self.old_blob, set())
+        new_options = options.get(self.new_blob, set())
         self.added_options = new_options.difference(old_options)
         self.removed_options = old_options.difference(new_options)
 
 
+# -----------------------------------------------------------------------------
+def read_changesets(git, since, until):
+    # One record per commit: a 'commit SHA DATE' line, followed by the raw
+    # diff line for options.h (missing for merges)
+    log = subprocess.check_output(
+        git + ['log', '--reverse', '--raw', '--abbrev=40', '--no-renames',
+               '--pretty=format:commit %H %at',
+               '{}..{}'.format(since, until), '--', ':src/options.h'])
+
+    changes = []
+    for line in log.decode('utf-8').splitlines():
+        if line.startswith('commit '):
+            _, sha, date = line.split()
+            changes.append(Changeset(sha, int(date)))
+        elif line.startswith(':') and changes:
+            info = line.split('\t')[0].split(' ')
+            changes[-1].old_blob = info[2]
+            changes[-1].new_blob = info[3]
+
+    return changes
+
+
+# -----------------------------------------------------------------------------
+def read_blobs(git, blob_ids):
+    # Stream the content of every blob through one 'git cat-file --batch'
+    proc = subprocess.Popen(git + ['cat-file', '--batch'],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        for blob_id in blob_ids:
+            proc.stdin.write('{}\n'.format(blob_id).encode('ascii'))
+            proc.stdin.flush()
+
+            header = proc.stdout.readline().split()
+            if len(header) != 3:
+                raise RuntimeError('cannot read blob {}'.format(blob_id))
+
+            content = proc.stdout.read(int(header[2]))
+            proc.stdout.read(1)  # trailing newline
+            yield blob_id, content
+    finally:
+        proc.stdin.close()
+        proc.wait()
+
+
+# -----------------------------------------------------------------------------
+def parse_blob(args):
+    blob_id, content = args
+    return blob_id, extract_options(content)
+
+
 # -----------------------------------------------------------------------------
 def main():
     parser = argparse.ArgumentParser(
@@ -74,33 +122,48 @@ def main():
     root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
     parser.add_argument('--repo', type=str, default=root,
                         help='Path to uncrustify git repository')
+    parser.add_argument('--git', type=str, default='git',
+                        help='git executable to use')
+    parser.add_argument('-j', '--jobs', type=int, default=cpu_count(),
+                        help='number of processes parsing options.h')
     parser.add_argument('since', type=str,
                         help='Revision (tag) of previous uncrustify version')
     parser.add_argument('until', type=str, default='master', nargs='?',
                         help='Revision (tag) of next uncrustify version')
 
     args = parser.parse_args()
-    repo = git.Repo(args.repo)
-    revs = repo.git.log('--pretty=%H', '--reverse',
-                        '{}..{}'.format(args.since, args.until),
-                        '--', ':src/options.h').split('\n')
+    git = [args.git, '-C', args.repo]
 
-    if revs == ['']:
+    changes = read_changesets(git, args.since, args.until)
+    if not changes:
         print('No changes were found')
         return 1
 
-    changes = []
-    for r in revs:
-        c = Changeset(repo, r)
-        if len(c.added_options) or len(c.removed_options):
-            changes.append(c)
+    # Consecutive commits share a version of options.h, so parse each once
+    blob_ids = []
+    seen = set([None, null_blob])
+    for c in changes:
+        for blob_id in (c.old_blob, c.new_blob):
+            if blob_id not in seen:
+                seen.add(blob_id)
+                blob_ids.append(blob_id)
+
+    pool = Pool(processes=args.jobs)
+    try:
+        options = dict(pool.imap_unordered(parse_blob,
+                                           read_blobs(git, blob_ids)))
+    finally:
+        pool.close()
+        pool.join()
 
     for c in changes:
-        print(c.sha)
-        for o in c.added_options:
-            print('  Added   : {:36} {}'.format(o, c.date))
-        for o in c.removed_options:
-            print('  Removed : {:36} {}'.format(o, c.date))
+        c.compute(options)
+        if len(c.added_options) or len(c.removed_options):
+            print(c.sha)
+            for o in c.added_options:
+                print('  Added   : {:36} {}'.format(o, c.date))
+            for o in c.removed_options:
+                print('  Removed : {:36} {}'.format(o, c.date))
 
     return 0
 
@@ -0,0 +1,50 @@
+#
+# Helper for the code generators, which render their output in memory and
+# then only replace the output file if its content actually changed, so that
+# an unchanged generated header does not trigger recompilation of everything
+# that includes it.
+#
+
+import io
+import os
+import tempfile
+
+
+# -----------------------------------------------------------------------------
+def write_if_changed(path, text, encoding='utf-8'):
+    """
+    Write text to path, unless the file already has exactly that content.
+
+    The new content is written to a temporary file next to path, which then
+    atomically replaces it, so that an interrupted or concurrent build never
+    sees a partially written file. Newlines are written as os.linesep, as for
+    a file opened in text mode. Returns True if the file was written.
+    """
+    if os.linesep != '\n':
+        text = text.replace('\n', os.linesep)
+    data = text.encode(encoding)
+
+    try:
+        with io.open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except (IOError, OSError):
+        pass
+
+    out_dir = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(
+        dir=out_dir, prefix='.{}.'.format(os.path.basename(path)))
+    try:
+        with io.open(fd, 'wb') as f:
+            f.write(data)
+
+        # mkstemp creates the file readable by its owner only
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_path, 0o666 & ~umask)
+
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return True
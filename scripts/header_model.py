@@ -0,0 +1,227 @@
+#
+# Shared parser for the headers the code generators read: the option
+# declarations in options.h, the option value enumerations and aliases in
+# option.h and the token types in token_enum.h.
+#
+# The parsed model of each header can be kept in a cache file, keyed by the
+# header's modification time, size and content hash, so that generators run
+# by an incremental build only re-parse the headers that actually changed.
+#
+
+import hashlib
+import io
+import json
+import os
+import re
+
+from generated_file import write_if_changed
+
+re_group = re.compile(r'//BEGIN')
+re_option = re.compile(r'extern (Bounded)?Option<[^>]+>')
+re_default = re.compile(r' *// *= *(.*)')
+re_enum_decl = re.compile(r'enum class (\w+)( *// *<(\w+)>)?')
+re_enum_value = re.compile(r'(\w+)(?= *([,=]|//|$))')
+re_values = re.compile(r'UNC_OPTVALS\((\w+)\)')
+re_aliases = re.compile(r'UNC_OPTVAL_ALIAS\(([^)]+)\)')
+re_token = re.compile(r'^(CT_\w+),')
+
+# Bump when the parsers or the layout of their results change
+model_version = 1
+
+
+# -----------------------------------------------------------------------------
+def parse_options(lines):
+    """
+    Parse the option declarations of options.h.
+
+    Returns a list of groups, each a dict with the group 'desc' and its
+    'options'; each option is a dict with its 'name', its 'decl' (the
+    declaration line), its 'default' (None if not given) and its 'desc' (a
+    list of lines).
+    """
+    groups = []
+    desc = []
+    lines = iter(lines)
+    for line in lines:
+        line = line.strip()
+
+        if re_group.match(line):
+            groups.append({'desc': line[8:], 'options': []})
+
+        elif not len(line):
+            desc = []
+
+        elif line == '//':
+            desc.append('')
+
+        elif line.startswith('// '):
+            desc.append(line[3:])
+
+        elif re_option.match(line):
+            n, _, d = next(lines, '').partition(';')
+            m = re_default.match(d.strip())
+            if not groups:
+                groups.append({'desc': None, 'options': []})
+            groups[-1]['options'].append({
+                'name': n.strip(),
+                'decl': line,
+                'default': m.group(1) if m else None,
+                'desc': list(desc),
+            })
+
+    return groups
+
+
+# -----------------------------------------------------------------------------
+def parse_enum(lines, enum):
+    for line in lines:
+        line = line.strip()
+
+        if line.startswith('{'):
+            for line in lines:
+                line = line.strip()
+                if line.startswith('};'):
+                    return
+
+                if 'UNC_INTERNAL' in line:
+                    return
+
+                if 'UNC_CONVERT_INTERNAL' in line:
+                    enum['convert_internal'] = True
+                    continue
+
+                mv = re_enum_value.match(line)
+                if mv is not None:
+                    enum['values'].append(mv.group(1))
+
+
+# -----------------------------------------------------------------------------
+def parse_optvals(lines):
+    """
+    Parse the option value enumerations of option.h.
+
+    Returns a dict with the 'enums' (a list of dicts with the enum 'name', its
+    'prefix', whether it is 'convert_internal' and its public 'values'), the
+    'values' (the names given to UNC_OPTVALS) and the 'aliases' (the arguments
+    of each UNC_OPTVAL_ALIAS, without quotes).
+    """
+    model = {'enums': [], 'values': [], 'aliases': []}
+    lines = iter(lines)
+    for line in lines:
+        line = line.strip()
+
+        me = re_enum_decl.match(line)
+        if me is not None:
+            enum = {
+                'name': me.group(1),
+                'prefix': me.group(3),
+                'convert_internal': False,
+                'values': [],
+            }
+            parse_enum(lines, enum)
+            model['enums'].append(enum)
+            continue
+
+        mv = re_values.match(line)
+        if mv is not None:
+            model['values'].append(mv.group(1))
+
+        ma = re_aliases.match(line)
+        if ma is not None:
+            args = [x.strip() for x in ma.group(1).split(',')]
+            model['aliases'].append(args[:2] + [x[1:-1] for x in args[2:]])
+
+    return model
+
+
+# -----------------------------------------------------------------------------
+def parse_tokens(lines):
+    """
+    Parse token_enum.h, returning the names of the token types (with their
+    CT_ prefix), in order.
+    """
+    tokens = []
+    for line in lines:
+        m = re_token.match(line.strip())
+        if m:
+            tokens.append(m.group(1))
+    return tokens
+
+
+# =============================================================================
+class HeaderModel(object):
+    """
+    In-memory model of the headers read by the code generators.
+
+    Each header is parsed at most once. If a cache file is given, the parsed
+    model of a header is reused as long as the header's modification time and
+    size, or failing that, its content hash, are unchanged; call save() to
+    write back any newly parsed header.
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.entries = {}
+        self.dirty = False
+
+        if cache is not None:
+            try:
+                with io.open(cache, 'rt', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == model_version:
+                    self.entries = data['headers']
+            except (IOError, OSError, ValueError, KeyError):
+                pass
+
+    # -------------------------------------------------------------------------
+    def _parse(self, path, kind, parser):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        entry = self.entries.get(path)
+
+        if (entry is not None and entry['kind'] == kind and
+                entry['mtime'] == st.st_mtime and entry['size'] == st.st_size):
+            return entry['model']
+
+        with io.open(path, 'rb') as f:
+            content = f.read()
+        digest = hashlib.sha1(content).hexdigest()
+
+        if entry is None or entry['kind'] != kind or entry['sha1'] != digest:
+            text = content.decode('utf-8')
+            entry = {
+                'kind': kind,
+                'sha1': digest,
+                'model': parser(io.StringIO(text)),
+            }
+
+        entry['mtime'] = st.st_mtime
+        entry['size'] = st.st_size
+        self.entries[path] = entry
+        self.dirty = True
+        return entry['model']
+
+    # -------------------------------------------------------------------------
+    def options(self, path):
+        return self._parse(path, 'options', parse_options)
+
+    # -------------------------------------------------------------------------
+    def optvals(self, path):
+        return self._parse(path, 'optvals', parse_optvals)
+
+    # -------------------------------------------------------------------------
+    def tokens(self, path):
+        return self._parse(path, 'tokens', parse_tokens)
+
+    # -------------------------------------------------------------------------
+    def save(self):
+        if self.cache is None or not self.dirty:
+            return
+
+        # Several generators may share the cache and run concurrently;
+        # write_if_changed() replaces it atomically
+        write_if_changed(self.cache, json.dumps({
+            'version': model_version,
+            'headers': self.entries,
+        }, sort_keys=True))
+        self.dirty = False
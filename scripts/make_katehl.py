@@ -5,12 +5,10 @@ import io
 import os
 import re
 
-re_token = re.compile(r'^CT_(\w+),')
+from generated_file import write_if_changed
+from header_model import HeaderModel
+
 re_version = re.compile(r'.*UNCRUSTIFY_VERSION\s*"Uncrustify-([^"]+)"')
-re_option = re.compile(r'extern (Bounded)?Option<[^>]+>')
-re_enum_decl = re.compile(r'enum class (\w+)( *// *<(\w+)>)?')
-re_enum_value = re.compile(r'(\w+)(?= *([,=]|//|$))')
-re_aliases = re.compile(r'UNC_OPTVAL_ALIAS\(([^)]+)\)')
 
 version = '0.0'
 options = set()
@@ -21,31 +19,6 @@ root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 script = os.path.relpath(__file__, root)
 
 
-# -----------------------------------------------------------------------------
-def read_enum(f):
-    global values
-
-    for line in iter(f.readline, ''):
-        line = line.strip()
-
-        if line.startswith('{'):
-            for line in iter(f.readline, ''):
-                line = line.strip()
-
-                if line.startswith('};'):
-                    return
-
-                if 'UNC_INTERNAL' in line:
-                    return
-
-                if 'UNC_CONVERT_INTERNAL' in line:
-                    return
-
-                mv = re_enum_value.match(line)
-                if mv is not None:
-                    values.add(mv.group(1).lower())
-
-
 # -----------------------------------------------------------------------------
 def write_items(out, items):
     for i in sorted(items):
@@ -83,6 +56,8 @@ def main():
                         help='location of option.h to read')
     parser.add_argument('tokens', type=str,
                         help='location of token_enum.h to read')
+    parser.add_argument('--model-cache', type=str, metavar='FILE',
+                        help='cache the parsed header model in FILE')
     args = parser.parse_args()
 
     # Read version
@@ -95,41 +70,29 @@ def main():
             if mv:
                 version = mv.group(1)
 
-    # Read options
-    with io.open(args.options, 'rt', encoding='utf-8') as f:
-        global options
-        for line in iter(f.readline, ''):
-            line = line.strip()
+    model = HeaderModel(args.model_cache)
 
-            if re_option.match(line):
-                n, d = f.readline().split(';')
-                options.add(n)
+    # Read options
+    global options
+    for group in model.options(args.options):
+        options.update(o['name'] for o in group['options'])
 
     # Read option values
-    with io.open(args.optvals, 'rt', encoding='utf-8') as f:
-        global values
-        for line in iter(f.readline, ''):
-            line = line.strip()
-
-            if re_enum_decl.match(line):
-                read_enum(f)
-                continue
-
-            ma = re_aliases.match(line)
-            if ma:
-                for v in ma.group(1).split(',')[2:]:
-                    v = v.strip()[1:-1]
-                    values.add(v)
+    global values
+    optvals = model.optvals(args.optvals)
+    for enum in optvals['enums']:
+        if not enum['convert_internal']:
+            values.update(v.lower() for v in enum['values'])
+    for alias_args in optvals['aliases']:
+        values.update(alias_args[2:])
 
     # Read tokens
-    with io.open(args.tokens, 'rt', encoding='utf-8') as f:
-        global tokens
-        for line in iter(f.readline, ''):
-            line = line.strip()
+    global tokens
+    for token in model.tokens(args.tokens):
+        if not token.endswith(u'_'):
+            tokens.add(token[3:].lower())
 
-            m = re_token.match(line)
-            if m and not m.group(1).endswith(u'_'):
-                tokens.add(m.group(1).lower())
+    model.save()
 
     # Declare replacements
     replacements = {
@@ -139,16 +102,18 @@ def main():
     }
 
     # Write output file
-    with io.open(args.output, 'wt', encoding='utf-8') as out:
-        with io.open(args.template, 'rt', encoding='utf-8') as t:
-            for line in t:
-                directive = line.strip()
-                if directive in replacements:
-                    replacements[directive](out, args)
-                else:
-                    if '##VERSION##' in line:
-                        line = line.replace('##VERSION##', version)
-                    out.write(line)
+    out = io.StringIO()
+    with io.open(args.template, 'rt', encoding='utf-8') as t:
+        for line in t:
+            directive = line.strip()
+            if directive in replacements:
+                replacements[directive](out, args)
+            else:
+                if '##VERSION##' in line:
+                    line = line.replace('##VERSION##', version)
+                out.write(line)
+
+    write_if_changed(args.output, out.getvalue())
 
 # %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 
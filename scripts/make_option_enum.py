@@ -3,12 +3,10 @@
 import argparse
 import io
 import os
-import re
 
-re_enum_decl = re.compile(r'enum class (\w+)( *// *<(\w+)>)?')
-re_enum_value = re.compile(r'(\w+)(?= *([,=]|//|$))')
-re_values = re.compile(r'UNC_OPTVALS\((\w+)\)')
-re_aliases = re.compile(r'UNC_OPTVAL_ALIAS\(([^)]+)\)')
+from generated_file import write_if_changed
+from header_model import HeaderModel
+
 enums = {}
 values = {}
 
@@ -19,40 +17,17 @@ script = os.path.relpath(__file__, root)
 # =============================================================================
 class Enumeration(object):
     # -------------------------------------------------------------------------
-    def __init__(self, name, prefix, f):
+    def __init__(self, name, prefix, values, convert_internal):
         self.name = name
         self.prefix = prefix
 
-        self.values = []
-        self.value_aliases = {}
-
-        self.convert_internal = False
-
-        for line in iter(f.readline, ''):
-            line = line.strip()
-
-            if line.startswith('{'):
-                for line in iter(f.readline, ''):
-                    line = line.strip()
-                    if line.startswith('};'):
-                        return
-
-                    if 'UNC_INTERNAL' in line:
-                        return
+        self.values = values
+        self.value_aliases = dict((v, [v.lower()]) for v in values)
 
-                    if 'UNC_CONVERT_INTERNAL' in line:
-                        self.convert_internal = True
-                        continue
-
-                    mv = re_enum_value.match(line)
-                    if mv is not None:
-                        v = mv.group(1)
-                        self.values.append(v)
-                        self.value_aliases[v] = [v.lower()]
+        self.convert_internal = convert_internal
 
     # -------------------------------------------------------------------------
-    def add_aliases(self, value, *args):
-        aliases = [x[1:-1] for x in args]  # strip quotes
+    def add_aliases(self, value, *aliases):
         self.value_aliases[value] += aliases
 
 # %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
@@ -101,39 +76,77 @@ def write_aliases(out, args):
 
 
 # -----------------------------------------------------------------------------
-def write_conversions(out, args):
+def lookup_table(enum):
+    # Map each (lower case) spelling to the value it converts to; if the same
+    # alias is given for several values, the first one wins
+    table = {}
+    for v in enum.values:
+        for a in enum.value_aliases[v]:
+            table.setdefault(a.lower(), v)
+    return table
+
+
+# -----------------------------------------------------------------------------
+def write_from_string(out, args):
     header = u'\n//{}\n'.format('-' * 77)
 
     for enum in enums.values():
         if enum.convert_internal:
             continue
 
+        # Dispatch on the length and the first character of the input, so
+        # that at most a couple of strings have to be compared
+        dispatch = {}
+        for a, v in sorted(lookup_table(enum).items()):
+            dispatch.setdefault(len(a), {}).setdefault(a[0], []).append(
+                (a, v))
+
         out.write(header)
         out.write(
             u'bool convert_string(const char *in, {} &out)\n'.format(
                 enum.name))
         out.write(
             u'{\n'
-            u'   if (false)\n'
-            u'   {\n'
-            u'   }\n')
+            u'   switch (strlen(in))\n'
+            u'   {\n')
 
-        for v in enum.values:
-            for a in enum.value_aliases[v]:
-                out.write(
-                    u'   else if (strcasecmp(in, "{}") == 0)\n'
-                    u'   {{\n'
-                    u'      out = {};\n'
-                    u'      return(true);\n'
-                    u'   }}\n'.format(a, enum_value(enum, v)))
+        for length in sorted(dispatch):
+            out.write(
+                u'   case {}:\n'
+                u'      switch (unc_tolower(in[0]))\n'
+                u'      {{\n'.format(length))
+
+            for ch in sorted(dispatch[length]):
+                out.write(u'      case \'{}\':\n'.format(ch))
+
+                for a, v in dispatch[length][ch]:
+                    out.write(
+                        u'         if (strcasecmp(in, "{}") == 0)\n'
+                        u'         {{\n'
+                        u'            out = {};\n'
+                        u'            return(true);\n'
+                        u'         }}\n'.format(a, enum_value(enum, v)))
+
+                out.write(u'         break;\n\n')
+
+            out.write(
+                u'      default:\n'
+                u'         break;\n'
+                u'      }\n'
+                u'      break;\n\n')
 
         out.write(
-            u'   else\n'
-            u'   {\n'
-            u'      return(false);\n'
+            u'   default:\n'
+            u'      break;\n'
             u'   }\n'
+            u'   return(false);\n'
             u'}\n\n')
 
+
+# -----------------------------------------------------------------------------
+def write_to_string(out, args):
+    header = u'\n//{}\n'.format('-' * 77)
+
     for enum in enums.values():
         out.write(header)
         out.write(u'const char *to_string({} val)\n'.format(enum.name))
@@ -158,6 +171,36 @@ def write_conversions(out, args):
             u'}}\n\n'.format(enum.name))
 
 
+# -----------------------------------------------------------------------------
+def write_conversions(out, args):
+    write_from_string(out, args)
+    write_to_string(out, args)
+
+
+# -----------------------------------------------------------------------------
+def write_self_test(out, args):
+    for enum in enums.values():
+        if enum.convert_internal:
+            continue
+
+        table = lookup_table(enum)
+        out.write(u'   // {}\n'.format(enum.name))
+
+        for a in sorted(table):
+            ev = enum_value(enum, table[a])
+            for s in sorted(set([a, a.upper(), a.capitalize()])):
+                out.write(u'   check("{}", {});\n'.format(s, ev))
+
+        # Near misses must be rejected
+        invalid = set([u''])
+        for a in table:
+            invalid.update([a[:-1], a + u'x', u'x' + a])
+        for s in sorted(invalid - set(table)):
+            out.write(u'   check_invalid<{}>("{}");\n'.format(enum.name, s))
+
+        out.write(u'\n')
+
+
 # -----------------------------------------------------------------------------
 def main():
     parser = argparse.ArgumentParser(description='Generate options.cpp')
@@ -168,45 +211,42 @@ def main():
     parser.add_argument('template', type=str,
                         help='location of option_enum.cpp.in '
                              'to use as template')
+    parser.add_argument('--model-cache', type=str, metavar='FILE',
+                        help='cache the parsed header model in FILE')
     args = parser.parse_args()
 
-    with io.open(args.header, 'rt', encoding='utf-8') as f:
-        for line in iter(f.readline, ''):
-            line = line.strip()
+    model = HeaderModel(args.model_cache)
+    optvals = model.optvals(args.header)
+    model.save()
 
-            me = re_enum_decl.match(line)
-            if me is not None:
-                e = Enumeration(me.group(1), me.group(3), f)
-                enums[e.name] = e
-                continue
+    for e in optvals['enums']:
+        enums[e['name']] = Enumeration(e['name'], e['prefix'], e['values'],
+                                       e['convert_internal'])
 
-            mv = re_values.match(line)
-            if mv is not None:
-                enum_name = mv.group(1)
-                enum = enums['{}_e'.format(enum_name)]
-                values[enum_name] = enum.values
+    for enum_name in optvals['values']:
+        values[enum_name] = enums['{}_e'.format(enum_name)].values
 
-            ma = re_aliases.match(line)
-            if ma is not None:
-                alias_args = [x.strip() for x in ma.group(1).split(',')]
-                enum = enums[alias_args[0]]
-                enum.add_aliases(*alias_args[1:])
+    for alias_args in optvals['aliases']:
+        enums[alias_args[0]].add_aliases(*alias_args[1:])
 
     replacements = {
         u'##BANNER##': write_banner,
         u'##VALUE_STRINGS##': write_value_strings,
         u'##ALIASES##': write_aliases,
         u'##CONVERSIONS##': write_conversions,
+        u'##SELF_TEST##': write_self_test,
     }
 
-    with io.open(args.output, 'wt', encoding='utf-8') as out:
-        with io.open(args.template, 'rt', encoding='utf-8') as t:
-            for line in t:
-                directive = line.strip()
-                if directive in replacements:
-                    replacements[directive](out, args)
-                else:
-                    out.write(line)
+    out = io.StringIO()
+    with io.open(args.template, 'rt', encoding='utf-8') as t:
+        for line in t:
+            directive = line.strip()
+            if directive in replacements:
+                replacements[directive](out, args)
+            else:
+                out.write(line)
+
+    write_if_changed(args.output, out.getvalue())
 
 
 # %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
@@ -5,12 +5,12 @@ import io
 import os
 import re
 
+from generated_file import write_if_changed
+from header_model import HeaderModel
+
 max_name_len = 60
 
 re_name = re.compile(r'^[a-z][a-z0-9_]*$')
-re_group = re.compile(r'//BEGIN')
-re_option = re.compile(r'extern (Bounded)?Option<[^>]+>')
-re_default = re.compile(r' *// *= *(.*)')
 groups = []
 
 root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -57,14 +57,6 @@ class Option(object):
 # %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 
 
-# -----------------------------------------------------------------------------
-def extract_default(decl):
-    m = re_default.match(decl)
-    if m:
-        return m.group(1)
-    return None
-
-
 # -----------------------------------------------------------------------------
 def write_banner(out, args):
     out.write(
@@ -88,14 +80,109 @@ def write_declarations(out, args):
 
 
 # -----------------------------------------------------------------------------
-def write_registrations(out, args):
+def name_hash(name):
+    # Must match option_name_hash() in options.cpp.in (32-bit FNV-1a of the
+    # lower case name)
+    h = 0x811c9dc5
+    for c in name.lower():
+        h = ((h ^ ord(c)) * 0x01000193) & 0xffffffff
+    return h
+
+
+# -----------------------------------------------------------------------------
+def slot_hash(h, seed):
+    # Must match option_slot_hash() in options.cpp.in (MurmurHash3 finalizer)
+    h = (h + seed) & 0xffffffff
+    h ^= h >> 16
+    h = (h * 0x85ebca6b) & 0xffffffff
+    h ^= h >> 13
+    h = (h * 0xc2b2ae35) & 0xffffffff
+    h ^= h >> 16
+    return h
+
+
+# -----------------------------------------------------------------------------
+def perfect_hash(names):
+    # Build a minimal perfect hash of names, using hash and displace: the
+    # names are distributed over len(names) buckets by their hash; starting
+    # with the fullest bucket, a seed is searched for each bucket that sends
+    # all its names to distinct free slots. Returns the seed of each bucket
+    # (0 if it is empty) and the name in each slot.
+    size = len(names)
+    hashes = dict((name, name_hash(name)) for name in names)
+    if len(set(hashes.values())) != size:
+        raise ValueError('option names have colliding hashes')
+
+    buckets = [[] for _ in range(size)]
+    for name in names:
+        buckets[hashes[name] % size].append(name)
+
+    seeds = [0] * size
+    slots = [None] * size
+    for b in sorted(range(size), key=lambda b: -len(buckets[b])):
+        if not buckets[b]:
+            break
+
+        seed = 1
+        while True:
+            pos = [slot_hash(hashes[n], seed) % size for n in buckets[b]]
+            if (len(set(pos)) == len(pos) and
+                    all(slots[p] is None for p in pos)):
+                break
+            seed += 1
+
+        seeds[b] = seed
+        for name, p in zip(buckets[b], pos):
+            slots[p] = name
+
+    return seeds, slots
+
+
+# -----------------------------------------------------------------------------
+def write_indexes(out, args):
+    options = [o for g in groups for o in g.options]
+
+    out.write(u'//! All options, in declaration order\n')
+    out.write(u'GenericOption *const option_list[] =\n{\n')
+    for option in options:
+        out.write(u'   &options::{},\n'.format(option.name))
+    out.write(u'};\n\n')
+
+    out.write(u'//! Option groups, as ranges of option_list\n')
+    out.write(u'const option_group_index_t option_group_index[] =\n{\n')
+    first = 0
     for group in groups:
-        out.write(u'\n  begin_option_group(u8R"__(\n{}\n)__");\n\n'.format(
-            group.desc))
+        out.write(u'   {{ u8R"__(\n{}\n)__", {}, {} }},\n'.format(
+            group.desc, first, len(group.options)))
+        first += len(group.options)
+    out.write(u'};\n\n')
 
-        for option in group.options:
-            out.write(u'  register_option(&options::{});\n'.format(
-                option.name))
+    seeds, slots = perfect_hash([o.name for o in options])
+    seed_type = u'UINT16' if max(seeds) < (1 << 16) else u'UINT32'
+
+    out.write(u'//! Perfect hash seeds, by option_name_hash() bucket\n')
+    out.write(u'const {} option_name_seeds[] =\n{{\n'.format(seed_type))
+    for i in range(0, len(seeds), 16):
+        out.write(u'   {},\n'.format(
+            u', '.join(str(s) for s in seeds[i:i + 16])))
+    out.write(u'};\n\n')
+
+    out.write(u'//! Options, by perfect hash of their name\n')
+    out.write(u'GenericOption *const option_name_index[] =\n{\n')
+    for name in slots:
+        out.write(u'   &options::{},\n'.format(name))
+    out.write(u'};\n')
+
+
+# -----------------------------------------------------------------------------
+def read_groups(header, cache=None):
+    model = HeaderModel(cache)
+    for g in model.options(header):
+        group = Group(g['desc'])
+        for o in g['options']:
+            group.append(Option(o['name'], o['default'], o['decl'], o['desc']))
+        groups.append(group)
+    model.save()
 
 
 # -----------------------------------------------------------------------------
@@ -107,44 +194,28 @@ def main():
                         help='location of options.h to read')
     parser.add_argument('template', type=str,
                         help='location of options.cpp.in to use as template')
+    parser.add_argument('--model-cache', type=str, metavar='FILE',
+                        help='cache the parsed header model in FILE')
     args = parser.parse_args()
 
-    with io.open(args.header, 'rt', encoding='utf-8') as f:
-        desc = []
-        for line in iter(f.readline, ''):
-            line = line.strip()
-
-            if re_group.match(line):
-                groups.append(Group(line[8:]))
-
-            elif not len(line):
-                desc = []
-
-            elif line == '//':
-                desc.append('')
-
-            elif line.startswith('// '):
-                desc.append(line[3:])
-
-            elif re_option.match(line):
-                n, d = f.readline().split(';')
-                o = Option(n, extract_default(d.strip()), line, desc)
-                groups[-1].append(o)
+    read_groups(args.header, args.model_cache)
 
     replacements = {
         u'##BANNER##': write_banner,
         u'##DECLARATIONS##': write_declarations,
-        u'##REGISTRATIONS##': write_registrations,
+        u'##INDEXES##': write_indexes,
     }
 
-    with io.open(args.output, 'wt', encoding='utf-8') as out:
-        with io.open(args.template, 'rt', encoding='utf-8') as t:
-            for line in t:
-                directive = line.strip()
-                if directive in replacements:
-                    replacements[directive](out, args)
-                else:
-                    out.write(line)
+    out = io.StringIO()
+    with io.open(args.template, 'rt', encoding='utf-8') as t:
+        for line in t:
+            directive = line.strip()
+            if directive in replacements:
+                replacements[directive](out, args)
+            else:
+                out.write(line)
+
+    write_if_changed(args.output, out.getvalue())
 
 # %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 
@@ -7,9 +7,12 @@
 # @license GPL v2+
 #
 import argparse
+import io
 import os
 import sys
 
+from generated_file import write_if_changed
+
 
 # -----------------------------------------------------------------------------
 def scan_file(file_path):
@@ -116,22 +119,66 @@ def write_entry(out, max_len, ch, left_in_group, next_idx, tag, idx, tok):
 
 
 # -----------------------------------------------------------------------------
-def main():
-    parser = argparse.ArgumentParser(description='Generate punctuator_table.h')
-    parser.add_argument('output', type=str,
-                        help='location of punctuator_table.h to write')
-    parser.add_argument('header', type=str,
-                        help='location of symbols_table.h to read')
-    args = parser.parse_args()
+def build_dense(db):
+    """
+    Builds a dense transition table from the punctuator tree.
 
-    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    pl = scan_file(args.header)
-    pl.sort()
+    Each character that occurs in a punctuator is mapped to a class (class 0
+    is every other character), and each node of the tree to a state (state 0
+    is the root, and also means 'no transition'). Returns the class of each
+    character, the next state for each state and class, and the characters
+    leading to and table entry of each state.
+    """
+    chars = set()
 
-    db = {}
-    for a in pl:
-        add_to_db(a, db)
+    def collect(node):
+        for ch, en in node.items():
+            chars.add(ch)
+            collect(en[3])
+
+    collect(db)
+    classes = {ch: idx + 1 for idx, ch in enumerate(sorted(chars))}
+
+    next_state = []
+    entries = []
+    pending = [(db, '', None)]
+    while pending:
+        node, prefix, entry = pending.pop(0)
+        row = [0] * (len(classes) + 1)
+        for ch in sorted(node):
+            en = node[ch]
+            row[classes[ch]] = len(entries) + len(pending) + 1
+            pending.append((en[3], prefix + ch, en[2]))
+        next_state.append(row)
+        entries.append((prefix, entry))
 
+    return classes, next_state, entries
+
+
+# -----------------------------------------------------------------------------
+def write_banner(out, args, root):
+    in_name = os.path.basename(args.header)
+    out_name = os.path.basename(args.output)
+    guard = out_name.replace('.', '_').upper()
+
+    out.write(
+        '/**\n'
+        ' * @file {out_name}\n'
+        ' * Automatically generated by <code>{script}</code>\n'
+        ' * from {in_name}.\n'
+        ' */\n'
+        '\n'
+        '#ifndef SRC_{guard}_\n'
+        '#define SRC_{guard}_\n'
+        '\n'
+        '// *INDENT-OFF*\n'.format(
+            in_name=in_name, out_name=out_name, guard=guard,
+            script=os.path.relpath(__file__, root)))
+    return guard
+
+
+# -----------------------------------------------------------------------------
+def write_linked(out, db, name='punc_table'):
     arr = []
     build_table(db, '', arr)
 
@@ -141,46 +188,112 @@ def main():
         if rec is not None and (len(rec[1]) + 1) > max_len:
             max_len = len(rec[1]) + 1
 
-    in_name = os.path.basename(args.header)
-    out_name = os.path.basename(args.output)
-    guard = out_name.replace('.', '_').upper()
+    out.write(
+        'static const lookup_entry_t {}[] =\n'
+        '{{\n'.format(name))
+
+    idx = 0
+
+    for i in arr:
+        rec = i[4]
+        if len(i[0]) == 0:
+            write_entry(out, max_len, '0', '0', '0', 'nullptr', idx, '')
+        elif rec is None:
+            write_entry(out, max_len, escape(i[0]), i[2], i[3],
+                        'nullptr', idx, quote(i[1]))
+        else:
+            write_entry(out, max_len, escape(i[0]), i[2], i[3],
+                        '&' + rec[1], idx, quote(i[1]))
+        idx += 1
+
+    out.write('};\n')
+
+
+# -----------------------------------------------------------------------------
+def write_dense(out, db, prefix='punc_dense'):
+    classes, next_state, entries = build_dense(db)
+    state_type = 'UINT8' if len(next_state) <= 0x100 else 'UINT16'
+
+    out.write(
+        '#define PUNC_TABLE_DENSE\n'
+        '\n'
+        '// character class of each (unsigned) char; 0 if it does not occur\n'
+        '// in any punctuator\n'
+        'static const UINT8 {}_class[256] =\n'
+        '{{\n'.format(prefix))
+    row = [0] * 256
+    for ch, cls in classes.items():
+        row[ord(ch)] = cls
+    for i in range(0, 256, 16):
+        out.write('   {},\n'.format(
+            ', '.join('{:>2d}'.format(c) for c in row[i:i + 16])))
+    out.write('};\n\n')
+
+    out.write(
+        '// next state for each state and character class; 0 if none\n'
+        '// classes: {}\n'
+        'static const {} {}_next[{}][{}] =\n'
+        '{{\n'.format(
+            ' '.join(ch for ch in sorted(classes)), state_type, prefix,
+            len(next_state), len(classes) + 1))
+    for idx, row in enumerate(next_state):
+        out.write('   {{ {} }},  // {:3d}\n'.format(
+            ', '.join('{:>3d}'.format(n) for n in row), idx))
+    out.write('};\n\n')
+
+    out.write(
+        '// table entry of each state\n'
+        'static const chunk_tag_t *const {}_tag[{}] =\n'
+        '{{\n'.format(prefix, len(entries)))
+    max_len = max(len(e[1]) for _, e in entries if e is not None) + 2
+    for idx, (text, entry) in enumerate(entries):
+        tag = 'nullptr,' if entry is None else '&{},'.format(entry[1])
+        out.write('   {:{}} // {:3d}: {}\n'.format(
+            tag, max_len, idx, quote(text)).rstrip())
+        out.write('\n')
+    out.write('};\n')
+
+
+# -----------------------------------------------------------------------------
+def read_db(header):
+    pl = scan_file(header)
+    pl.sort()
+
+    db = {}
+    for a in pl:
+        add_to_db(a, db)
+    return db
+
+
+# -----------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='Generate punctuator_table.h')
+    parser.add_argument('output', type=str,
+                        help='location of punctuator_table.h to write')
+    parser.add_argument('header', type=str,
+                        help='location of symbols_table.h to read')
+    parser.add_argument('--format', choices=['linked', 'dense'],
+                        default='linked',
+                        help='table format: sibling-linked entries searched '
+                             'per character (default), or a dense '
+                             'state/character-class transition table')
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    db = read_db(args.header)
+
+    out = io.StringIO()
+    guard = write_banner(out, args, root)
+    if args.format == 'dense':
+        write_dense(out, db)
+    else:
+        write_linked(out, db)
+    out.write(
+        '// *INDENT-ON*\n'
+        '\n'
+        '#endif /* SRC_{guard}_ */\n'.format(guard=guard))
 
-    with open(args.output, 'wt') as out:
-        out.write(
-            '/**\n'
-            ' * @file {out_name}\n'
-            ' * Automatically generated by <code>{script}</code>\n'
-            ' * from {in_name}.\n'
-            ' */\n'
-            '\n'
-            '#ifndef SRC_{guard}_\n'
-            '#define SRC_{guard}_\n'
-            '\n'
-            '// *INDENT-OFF*\n'
-            'static const lookup_entry_t punc_table[] =\n'
-            '{{\n'.format(
-                in_name=in_name, out_name=out_name, guard=guard,
-                script=os.path.relpath(__file__, root)))
-
-        idx = 0
-
-        for i in arr:
-            rec = i[4]
-            if len(i[0]) == 0:
-                write_entry(out, max_len, '0', '0', '0', 'nullptr', idx, '')
-            elif rec is None:
-                write_entry(out, max_len, escape(i[0]), i[2], i[3],
-                            'nullptr', idx, quote(i[1]))
-            else:
-                write_entry(out, max_len, escape(i[0]), i[2], i[3],
-                            '&' + rec[1], idx, quote(i[1]))
-            idx += 1
-
-        out.write(
-            '}};\n'
-            '// *INDENT-ON*\n'
-            '\n'
-            '#endif /* SRC_{guard}_ */\n'.format(guard=guard))
+    write_if_changed(args.output, out.getvalue())
 
 # %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 
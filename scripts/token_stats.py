@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+#
+# Tokenizes a source tree with tokenizer.py, using a pool of worker processes,
+# and reports punctuator, identifier and number frequencies along with a
+# histogram of line lengths.
+#
+# Used to pick representative benchmark inputs and to size thresholds (such
+# as alignment spans) on real code.
+#
+
+import argparse
+import json
+import os
+import sys
+
+from collections import Counter
+from multiprocessing import cpu_count
+from multiprocessing.pool import Pool
+
+from tokenizer import (Tokenizer, TOK_NEWLINE, TOK_PUNCTUATOR, TOK_INTEGER,
+                       TOK_FLOAT, TOK_STRING, TOK_IDENTIFIER)
+
+type_names = {
+    TOK_NEWLINE: 'newline',
+    TOK_PUNCTUATOR: 'punctuator',
+    TOK_INTEGER: 'integer',
+    TOK_FLOAT: 'float',
+    TOK_STRING: 'string',
+    TOK_IDENTIFIER: 'identifier',
+}
+
+
+# =============================================================================
+class Stats(object):
+    """
+    Token and line statistics for a set of files.
+
+    The identifier and number counters are pruned to max_keys entries, so
+    that memory stays bounded on large trees; the least frequent keys are
+    dropped, which makes their counts approximate (see pruned).
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self.files = 0
+        self.chars = 0
+        self.partial = []
+        self.types = Counter()
+        self.punctuators = Counter()
+        self.identifiers = Counter()
+        self.numbers = Counter()
+        self.line_lengths = Counter()
+        self.file_tokens = Counter()
+        self.pruned = False
+
+    # -------------------------------------------------------------------------
+    def _prune(self):
+        for counter in (self.identifiers, self.numbers, self.file_tokens):
+            if len(counter) > self.max_keys:
+                keep = counter.most_common(self.max_keys // 2)
+                counter.clear()
+                counter.update(dict(keep))
+                self.pruned = True
+
+    # -------------------------------------------------------------------------
+    def add_file(self, path, tab_size):
+        with open(path, 'rb') as f:
+            tokens = 0
+            t = Tokenizer()
+            for text, tok_type in t.iter_tokens(f):
+                tokens += 1
+                self.types[tok_type] += 1
+                if tok_type == TOK_IDENTIFIER:
+                    self.identifiers[text] += 1
+                elif tok_type == TOK_PUNCTUATOR:
+                    self.punctuators[text] += 1
+                elif tok_type == TOK_INTEGER or tok_type == TOK_FLOAT:
+                    self.numbers[text] += 1
+
+            f.seek(0)
+            chars = 0
+            for line in f:
+                line = line.decode('utf-8', 'replace')
+                chars += len(line)
+                self.line_lengths[len(line.rstrip('\r\n')
+                                      .expandtabs(tab_size))] += 1
+
+        self.files += 1
+        self.chars += chars
+        self.file_tokens[path] = tokens
+        if t.text_idx < chars:
+            # The tokenizer gave up at some character it doesn't know
+            self.partial.append(path)
+        self._prune()
+
+    # -------------------------------------------------------------------------
+    def merge(self, other):
+        self.files += other.files
+        self.chars += other.chars
+        self.partial += other.partial
+        self.types.update(other.types)
+        self.punctuators.update(other.punctuators)
+        self.identifiers.update(other.identifiers)
+        self.numbers.update(other.numbers)
+        self.line_lengths.update(other.line_lengths)
+        self.file_tokens.update(other.file_tokens)
+        self.pruned = self.pruned or other.pruned
+        self._prune()
+
+    # -------------------------------------------------------------------------
+    def percentile(self, p):
+        total = sum(self.line_lengths.values())
+        seen = 0
+        for length in sorted(self.line_lengths):
+            seen += self.line_lengths[length]
+            if seen * 100 >= total * p:
+                return length
+        return 0
+
+    # -------------------------------------------------------------------------
+    def to_json(self, top):
+        return {
+            'files': self.files,
+            'chars': self.chars,
+            'approximate': self.pruned,
+            'partially_tokenized': sorted(self.partial),
+            'types': {type_names[k]: v for k, v in self.types.items()},
+            'punctuators': dict(self.punctuators),
+            'identifiers': dict(self.identifiers.most_common(top)),
+            'numbers': dict(self.numbers.most_common(top)),
+            'line_lengths': {str(k): v
+                             for k, v in sorted(self.line_lengths.items())},
+            'largest_files': self.file_tokens.most_common(top),
+        }
+
+
+# -----------------------------------------------------------------------------
+def find_files(paths, extensions):
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+            for name in sorted(filenames):
+                if extensions and os.path.splitext(name)[1] not in extensions:
+                    continue
+                yield os.path.join(dirpath, name)
+
+
+# -----------------------------------------------------------------------------
+def batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# -----------------------------------------------------------------------------
+def init_worker():
+    # The tokenizer reports characters it can't handle on stdout
+    sys.stdout = open(os.devnull, 'w')
+
+
+# -----------------------------------------------------------------------------
+def process_batch(args):
+    paths, tab_size, max_keys = args
+    stats = Stats(max_keys)
+    for path in paths:
+        try:
+            stats.add_file(path, tab_size)
+        except (IOError, OSError) as exc:
+            sys.stderr.write('{}: {}\n'.format(path, exc))
+    return stats
+
+
+# -----------------------------------------------------------------------------
+def print_counter(title, counter, top):
+    total = sum(counter.values())
+    print('\n{} (top {} of {}):'.format(title, min(top, len(counter)),
+                                         len(counter)))
+    for key, count in counter.most_common(top):
+        print('  {:>10d} {:6.2f}%  {}'.format(count, 100.0 * count / total,
+                                              key))
+
+
+# -----------------------------------------------------------------------------
+def print_report(stats, top, bucket):
+    print('Files      : {}'.format(stats.files))
+    print('Size       : {:.2f} MiB'.format(stats.chars / float(1024 * 1024)))
+    print('Lines      : {}'.format(sum(stats.line_lengths.values())))
+    print('Tokens     : {}'.format(sum(stats.types.values())))
+    for tok_type in sorted(stats.types):
+        print('  {:11}: {}'.format(type_names[tok_type],
+                                   stats.types[tok_type]))
+    if stats.partial:
+        print('{} file(s) could only partly be tokenized'.format(
+            len(stats.partial)))
+    if stats.pruned:
+        print('(identifier and number counts are approximate)')
+
+    print_counter('Punctuators', stats.punctuators, top)
+    print_counter('Identifiers', stats.identifiers, top)
+    print_counter('Numbers', stats.numbers, top)
+
+    print('\nLargest files by tokens:')
+    for path, count in stats.file_tokens.most_common(top):
+        print('  {:>10d}  {}'.format(count, path))
+
+    print('\nLine length percentiles:')
+    print('  ' + '  '.join('p{}={}'.format(p, stats.percentile(p))
+                           for p in (50, 90, 95, 99, 100)))
+
+    print('\nLine length histogram:')
+    buckets = Counter()
+    for length, count in stats.line_lengths.items():
+        buckets[length // bucket] += count
+    total = sum(buckets.values())
+    for b in sorted(buckets):
+        print('  {:>5d}-{:<5d} {:>10d} {:6.2f}%'.format(
+            b * bucket, (b + 1) * bucket - 1, buckets[b],
+            100.0 * buckets[b] / total))
+
+
+# -----------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(
+        description='Report token statistics for a source tree')
+    parser.add_argument('paths', metavar='PATH', nargs='+',
+                        help='files or directories to scan')
+    parser.add_argument('-j', '--jobs', type=int, default=cpu_count(),
+                        help='number of worker processes')
+    parser.add_argument('-e', '--ext', action='append', default=[],
+                        metavar='EXT',
+                        help='only scan files with this extension '
+                             '(e.g. .cpp; may be repeated)')
+    parser.add_argument('-n', '--top', type=int, default=20,
+                        help='number of entries to show per table')
+    parser.add_argument('--bucket', type=int, default=10,
+                        help='width of the line length histogram buckets')
+    parser.add_argument('--tab-size', type=int, default=8,
+                        help='tab size used to compute line lengths')
+    parser.add_argument('--max-keys', type=int, default=200000,
+                        help='maximum number of distinct identifiers and '
+                             'numbers to keep track of')
+    parser.add_argument('--batch', type=int, default=64,
+                        help='number of files per worker task')
+    parser.add_argument('--json', type=str, metavar='FILE',
+                        help='also write the statistics to FILE as JSON')
+    args = parser.parse_args()
+
+    files = find_files(args.paths, set(args.ext))
+    tasks = ((b, args.tab_size, args.max_keys)
+             for b in batches(files, args.batch))
+
+    stats = Stats(args.max_keys)
+    pool = Pool(processes=args.jobs, initializer=init_worker)
+    try:
+        for partial in pool.imap_unordered(process_batch, tasks):
+            stats.merge(partial)
+    finally:
+        pool.close()
+        pool.join()
+
+    if not stats.files:
+        print('No files found')
+        return 1
+
+    print_report(stats, args.top, args.bucket)
+
+    if args.json:
+        with open(args.json, 'wt') as f:
+            json.dump(stats.to_json(args.top), f, indent=2, sort_keys=True)
+
+    return 0
+
+
+# %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+if __name__ == '__main__':
+    sys.exit(main())
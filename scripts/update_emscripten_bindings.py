@@ -8,9 +8,16 @@ from subprocess import Popen, PIPE
 from sys import exit as sys_exit, stderr
 from tempfile import mkstemp
 from contextlib import contextmanager
+from collections import OrderedDict
+from hashlib import sha1
+from multiprocessing.pool import ThreadPool
 from threading import Timer
+import json
 import re
 
+from generated_file import write_if_changed
+from header_model import HeaderModel
+
 
 ROOT_DIR = dirname(dirname(abspath(__file__)))
 
@@ -90,6 +97,14 @@ ENUMS_INFO = [
 
 # ==============================================================================
 
+HEADER_MODEL = HeaderModel()
+
+''' Enum values extracted via clang-check, by header path '''
+ENUM_CACHE_FILE = "%s/emscripten/.enum_cache.json" % ROOT_DIR
+
+''' Values of the enums in ENUMS_INFO, by enum name '''
+ENUM_LINES = {}
+
 NULL_DEV = "/dev/null" if os_name != "nt" else "nul"
 
 
@@ -150,37 +165,173 @@ def proc_output(args, timeout_sec=10):
     return output if not timeout["value"] else None
 
 
-def get_enum_lines(enum_info):
+def get_model_enum_lines(enum_info):
     """
-    extracts enum values from a file via clang-check
+    looks up enum values in the header model shared with the code generators,
+    which covers the option value enums of option.h and the token types of
+    token_enum.h
 
     :param enum_info: dict with:
                         'name' (name of the enum),
-                        'filepath' (file containing the enum definition),
-                        'extra_arg' (extra arguments passed to clang-check)
-    :return: list containing enum values
+                        'filepath' (file containing the enum definition)
+    :return: list containing enum values, None if the enum is not covered
+    """
+    filepath = enum_info['filepath']
+
+    if filepath.endswith('/token_enum.h') and enum_info['name'] == 'c_token_t':
+        return HEADER_MODEL.tokens(filepath)
+
+    if filepath.endswith('/option.h'):
+        for enum in HEADER_MODEL.optvals(filepath)['enums']:
+            if enum['name'] == enum_info['name']:
+                return enum['values']
+
+    return None
+
+
+def parse_ast_dump(output):
+    """
+    extracts the values of every enum definition in a clang-check AST dump
+
+    :param output: output of clang-check -ast-dump
+    :return: dict mapping enum names to lists containing their values
+    """
+    reg_obj = re.compile(r"EnumConstantDecl.+col:\d+ (referenced )?(\w+)")
+
+    enums = {}
+    enum_depth = None
+    values = None
+
+    for line in output.splitlines() + [""]:
+        node = line.lstrip("|`- ")
+        depth = len(line) - len(node)
+
+        if values is not None and depth <= enum_depth:
+            if values:                            # skip forward declarations
+                enums[name] = values
+            values = None
+
+        if node.startswith("EnumDecl "):
+            # the name is followed by the underlying type, if one is given
+            name = re.sub(r"( '[^']*')+$", "", node).split()[-1]
+            enum_depth = depth
+            values = []
+
+        elif values is not None and node.startswith("EnumConstantDecl "):
+            match = re.search(reg_obj, node)
+            if match:
+                values.append(match.group(2))
+
+    return enums
+
+
+def extract_header_enums(header):
+    """
+    extracts the values of the enums of one header, running clang-check once
+
+    :param header: tuple of the header path, the extra arguments passed to
+                   clang-check and the list of the names of the enums
+    :return: dict mapping enum names to lists containing their values, None on
+             failure
     """
-    cut_len = len(enum_info['name'])
+    filepath, extra_arg, names = header
 
-    proc_args = ["clang-check", enum_info['filepath'], "-ast-dump",
-                 '-ast-dump-filter=%s' % enum_info['name']]
-    proc_args += enum_info['extra_arg']
+    proc_args = ["clang-check", filepath, "-ast-dump"]
+    if len(names) == 1:
+        proc_args.append('-ast-dump-filter=%s' % names[0])
+    proc_args += extra_arg
 
     output = proc_output(proc_args)
     if output is None or len(output) == 0:
-        print("ScriptError: %s - empty clang-check return" % get_enum_lines.__name__,
-              file=stderr)
-        return ()
+        print("ScriptError: %s - empty clang-check return for %s"
+              % (extract_header_enums.__name__, filepath), file=stderr)
+        return None
+
+    enums = parse_ast_dump(output)
+    return dict((name, enums.get(name, [])) for name in names)
 
-    reg_obj = re.compile("EnumConstantDecl.+col:\d+ (referenced )?(\w+)")
 
-    lines = [m.group(2) for l in output.splitlines()
-             for m in [re.search(reg_obj, l)] if m]
-    lines = [line for line in lines if line not in enum_info['filter_values']]
+def collect_enum_lines(enums_info):
+    """
+    extracts the values of all enums, from the header model where it covers
+    them, else via clang-check; clang-check runs once per header, with the
+    headers processed concurrently, and its results are cached by header
+    content hash in ENUM_CACHE_FILE
+
+    :param enums_info: list of dicts each containing:
+                    'name' (name of the enum),
+                    'filepath' (file containing the enum definition),
+                    'extra_arg' (extra arguments passed to clang-check),
+                    'filter_values' (values to leave out)
+    """
+    headers = OrderedDict()
+    for enum_info in enums_info:
+        lines = get_model_enum_lines(enum_info)
+        if lines is not None:
+            ENUM_LINES[enum_info['name']] = lines
+        else:
+            key = (enum_info['filepath'], tuple(enum_info['extra_arg']))
+            headers.setdefault(key, []).append(enum_info['name'])
+
+    try:
+        with open(ENUM_CACHE_FILE, 'r') as f:
+            cache = json.load(f)
+    except (IOError, OSError, ValueError):
+        cache = {}
+
+    cache_keys = {}
+    missing = []
+    for (filepath, extra_arg), names in headers.items():
+        with open(filepath, 'rb') as f:
+            digest = sha1(f.read()).hexdigest()
+        cache_keys[filepath] = '%s %s %s' % (
+            digest, ' '.join(extra_arg), ' '.join(names))
+
+        cached = cache.get(filepath)
+        if cached is not None and cached['key'] == cache_keys[filepath]:
+            ENUM_LINES.update(cached['enums'])
+        else:
+            missing.append((filepath, list(extra_arg), names))
+
+    if missing:
+        pool = ThreadPool(len(missing))
+        try:
+            results = pool.map(extract_header_enums, missing)
+        finally:
+            pool.close()
+            pool.join()
+
+        for (filepath, _, _), enums in zip(missing, results):
+            if enums is None:
+                continue
+            ENUM_LINES.update(enums)
+            if all(enums.values()):
+                cache[filepath] = {'key': cache_keys[filepath],
+                                   'enums': enums}
+
+        write_if_changed(ENUM_CACHE_FILE,
+                         json.dumps(cache, indent=1, sort_keys=True))
+
+    for enum_info in enums_info:
+        lines = ENUM_LINES.get(enum_info['name'], [])
+        ENUM_LINES[enum_info['name']] = [
+            line for line in lines if line not in enum_info['filter_values']]
+
+
+def get_enum_lines(enum_info):
+    """
+    returns the values of an enum, as extracted by collect_enum_lines
+
+    :param enum_info: dict with:
+                        'name' (name of the enum),
+                        'filepath' (file containing the enum definition)
+    :return: list containing enum values
+    """
+    lines = ENUM_LINES.get(enum_info['name'], [])
 
     if len(lines) == 0:
-        print("ScriptError: %s - no enum_info names found" % get_enum_lines.__name__,
-              file=stderr)
+        print("ScriptError: %s - no enum_info names found for %s"
+              % (get_enum_lines.__name__, enum_info['name']), file=stderr)
         return ()
     return lines
 
@@ -301,6 +452,8 @@ def update_file(file_path, writer_func, enums_info):
 
 
 def main():
+    collect_enum_lines(ENUMS_INFO)
+
     flag = update_file(FILE_BINDINGS, write_bindings, ENUMS_INFO)
     if not flag:
         return 1
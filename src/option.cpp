@@ -17,7 +17,6 @@
 #include "uncrustify_version.h"
 
 #include <fstream>
-#include <unordered_map>
 
 #include <cctype>
 #include <cstdarg>
@@ -85,8 +84,7 @@ static const char *DOC_TEXT_END = u8R"___(
 )___";
 
 
-std::vector<OptionGroup>                         option_groups;
-std::unordered_map<std::string, GenericOption *> option_map;
+std::vector<OptionGroup> option_groups;
 
 #define LOG_CONFIG(...)                            \
    do { log_config(); LOG_FMT(LNOTE, __VA_ARGS__); \
@@ -795,20 +793,6 @@ void register_option(GenericOption *option)
    assert(!option_groups.empty());
 
    option_groups.back().options.push_back(option);
-   option_map.emplace(option->name(), option);
-}
-
-
-//-----------------------------------------------------------------------------
-uncrustify::GenericOption *find_option(const char *name)
-{
-   const auto iter = option_map.find(to_lower(name));
-
-   if (iter != option_map.end())
-   {
-      return(iter->second);
-   }
-   return(nullptr);
 }
 
 
@@ -823,13 +807,6 @@ OptionGroup *get_option_group(size_t i)
 }
 
 
-//-----------------------------------------------------------------------------
-size_t get_option_count()
-{
-   return(option_map.size());
-}
-
-
 //-----------------------------------------------------------------------------
 void process_option_line(const std::string &config_line, const char *filename,
                          int &compat_level)
@@ -984,16 +961,16 @@ void process_option_line(const std::string &config_line, const char *filename,
             return;
          }
       }
-      const auto oi = option_map.find(cmd);
+      auto *const option = find_option(cmd.c_str());
 
-      if (oi == option_map.end())
+      if (option == nullptr)
       {
          OptionWarning w{ filename };
          w("unknown option '%s'", args[0].c_str());
       }
       else
       {
-         UNUSED(oi->second->read(args[1].c_str()));
+         UNUSED(option->read(args[1].c_str()));
       }
    }
 } // process_option_line
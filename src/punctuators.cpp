@@ -33,6 +33,47 @@ using namespace uncrustify;
 #include "punctuator_table.h"
 
 
+#ifdef PUNC_TABLE_DENSE
+
+
+const chunk_tag_t *find_punctuator(const char *str, int lang_flags)
+{
+   if (str == nullptr || str[0] == '\0')
+   {
+      return(nullptr);
+   }
+   const chunk_tag_t *match = nullptr;
+   size_t            state  = 0; // initially the root of the graph
+
+   // symbols6: max punc len = 6
+   for (int ch_idx = 0; ch_idx < 6 && str[ch_idx] != '\0'; ch_idx++)
+   {
+      const auto ch_class = punc_dense_class[static_cast<unsigned char>(str[ch_idx])];
+      state = punc_dense_next[state][ch_class];
+
+      if (state == 0)
+      {
+         break; // no transition for this char, or leaf reached
+      }
+      log_rule_B("enable_digraphs");
+
+      const chunk_tag_t *tag = punc_dense_tag[state];
+
+      if (  tag != nullptr
+         && (tag->lang_flags & lang_flags) != 0  // punctuator lang and processing lang match
+         && (  (tag->lang_flags & FLAG_DIG) == 0 // punctuator is not a di/tri-graph
+            || options::enable_digraphs()))      // or di/tri-graph processing is enabled
+      {
+         match = tag;
+      }
+   }
+
+   return(match);
+} // find_punctuator
+
+#else // PUNC_TABLE_DENSE
+
+
 const chunk_tag_t *find_punctuator(const char *str, int lang_flags)
 {
    if (str == nullptr || str[0] == '\0')
@@ -80,3 +121,5 @@ const chunk_tag_t *find_punctuator(const char *str, int lang_flags)
    }
    return(match);
 } // find_punctuator
+
+#endif // PUNC_TABLE_DENSE
@@ -11,12 +11,16 @@ Tests output generated by Uncrustifys commandline options
 """
 
 from __future__ import print_function
-from sys import stderr, argv, exit as sys_exit, version_info as py_version_info
+from sys import argv, exit as sys_exit, version_info as py_version_info
 from os import mkdir, remove, name as os_name
 from os.path import dirname, relpath, isdir, isfile, join as path_join, split as path_split
 from shutil import rmtree, copyfile
 from subprocess import Popen, PIPE, STDOUT
+from multiprocessing import Pool, cpu_count
+from fnmatch import fnmatchcase
+from copy import copy
 from io import open
+import sys
 import re
 import difflib
 import argparse
@@ -35,24 +39,35 @@ RE_CALLSTACK = r'\[CallStack:( \w+:\w+(, \w+:\w+)*|-DEBUG NOT SET-)?\]'
 RE_DO_SPACE = (r'\n\ndo_space : WARNING: unrecognize do_space:'
                r'\n[^\n]+\n[^\n]+\n')
 
+# mismatching outputs with more lines than this are not diffed with
+# difflib.ndiff, which takes quadratic time, but with diff_lines_linear
+MAX_NDIFF_LINES = 1000
+# number of lines diff_lines_linear looks ahead to resynchronize both sides
+LINEAR_DIFF_WINDOW = 50
+# number of differing lines diff_lines_linear shows at most
+MAX_LINEAR_DIFF_LINES = 200
+
 
 def eprint(*args, **kwargs):
     """
         print() wraper that sets file=stderr
     """
-    print(*args, file=stderr, **kwargs)
+    print(*args, file=sys.stderr, **kwargs)
 
 
-def decode_out(text):
-    text = text.decode('utf-8')
-    text = text.replace(u'\r\n', u'\n')
-    text = text.replace(u'\r', u'\n')
-    return text
+def normalize_out(data):
+    """
+    converts the \\r\\n and \\r line endings of Uncrustifys output to \\n
+    """
+    if b'\r' in data:
+        data = data.replace(b'\r\n', b'\n')
+        data = data.replace(b'\r', b'\n')
+    return data
 
 
 def proc(bin_path, args_arr=()):
     """
-    simple Popen wrapper to return std out/err utf8 strings
+    simple Popen wrapper to return std out/err, with normalized line endings
 
 
     Parameters
@@ -64,12 +79,12 @@ def proc(bin_path, args_arr=()):
         all needed arguments
 
 
-    :return: string, string
+    :return: bytes, bytes
     ----------------------------------------------------------------------------
         generated output of both stdout and stderr
 
     >>> proc("echo", "test")
-    'test'
+    b'test'
     """
     if not isfile(bin_path):
         eprint("bin is not a file: %s" % bin_path)
@@ -82,7 +97,7 @@ def proc(bin_path, args_arr=()):
 
     out_txt, err_txt = proc.communicate()
 
-    return decode_out(out_txt), decode_out(err_txt)
+    return normalize_out(out_txt), normalize_out(err_txt)
 
 
 def write_to_output_path(output_path, result_str):
@@ -104,31 +119,156 @@ def write_to_output_path(output_path, result_str):
         f.write(result_str)
 
 
-def get_file_content(fp):
+def get_file_bytes(fp):
+    """
+    returns the raw file content or None if fp is not a file
+    """
+    out = None
+
+    if isfile(fp):
+        with open(fp, 'rb') as f:
+            out = f.read()
+    else:
+        eprint("is not a file: %s" % fp)
+
+    return out
+
+
+def apply_result_manip(text, result_manip):
+    """
+    applies a lambda function, or a list or tuple of them, to a string
+    """
+    if result_manip is not None:
+        if type(result_manip) is list or type(result_manip) is tuple:
+            for m in result_manip:
+                text = m(text)
+        else:
+            text = result_manip(text)
+    return text
+
+
+def compare_output(result, expected, result_manip=None):
     """
-    returns file content as an utf8 string or None if fp is not a file
+    compares an output of Uncrustify with the expected output
+
+    Without result manipulators, the bytes are compared as they are, so
+    matching outputs are never decoded.
 
 
     Parameters
     ----------------------------------------------------------------------------
-    :param fp: string
-        path of the file that will be read
+    :param result: bytes
+        output generated by Uncrustify
+
+    :param expected: bytes
+        expected output
 
+    :param result_manip: lambda OR list or tuple of lambdas
+        see result_manip for check_generated_output
 
-    :return: string or None
+
+    :return: None OR string, string
     ----------------------------------------------------------------------------
-    the file content
+        None if the outputs match, otherwise the (manipulated) generated and
+        the expected output as utf8 strings
+    """
+    if result_manip is None and result == expected:
+        return None
+
+    res_txt = apply_result_manip(result.decode('utf-8'), result_manip)
+    exp_txt = expected.decode('utf-8')
+    if res_txt == exp_txt:
+        return None
+
+    return res_txt, exp_txt
+
 
+def diff_lines_linear(res_lines, exp_lines):
     """
-    out = None
+    linear time stand-in for difflib.ndiff, for outputs too large for it
 
-    if isfile(fp):
-        with open(fp, encoding="utf-8", newline="\n") as f:
-            out = f.read()
+    Walks both sides in step; where they differ, the two sides are
+    resynchronized at the nearest pair of equal lines (followed by another
+    pair of equal lines) within the next LINEAR_DIFF_WINDOW lines of each, so
+    every difference costs at most a constant amount of work. Runs of equal lines are
+    collapsed and at most MAX_LINEAR_DIFF_LINES differing lines are shown.
+    """
+    def in_sync(i, j):
+        if i >= len(res_lines) or j >= len(exp_lines):
+            return i >= len(res_lines) and j >= len(exp_lines)
+        if res_lines[i] != exp_lines[j]:
+            return False
+        return (i + 1 >= len(res_lines) or j + 1 >= len(exp_lines)
+                or res_lines[i + 1] == exp_lines[j + 1])
+
+    i = j = 0
+    equal = 0
+    shown = 0
+    hidden = 0
+    while i < len(res_lines) or j < len(exp_lines):
+        if (i < len(res_lines) and j < len(exp_lines)
+                and res_lines[i] == exp_lines[j]):
+            equal += 1
+            i += 1
+            j += 1
+            continue
+
+        if equal:
+            yield '  [%d equal lines]\n' % equal
+            equal = 0
+
+        # the nearest resynchronization point, by number of skipped lines;
+        # without one, a whole window of lines is shown as changed
+        res_left = min(LINEAR_DIFF_WINDOW, len(res_lines) - i)
+        exp_left = min(LINEAR_DIFF_WINDOW, len(exp_lines) - j)
+        skip = (res_left, exp_left)
+        if i + res_left == len(res_lines) and j + exp_left == len(exp_lines):
+            best = res_left + exp_left
+        else:
+            best = None
+
+        window = {}
+        for e in range(exp_left):
+            window.setdefault(exp_lines[j + e], e)
+        for d in range(res_left):
+            e = window.get(res_lines[i + d])
+            if (e is not None and (best is None or d + e < best)
+                    and in_sync(i + d, j + e)):
+                skip = (d, e)
+                best = d + e
+
+        changed = ([('- ', line) for line in res_lines[i:i + skip[0]]]
+                   + [('+ ', line) for line in exp_lines[j:j + skip[1]]])
+        for sign, line in changed:
+            if shown < MAX_LINEAR_DIFF_LINES:
+                shown += 1
+                yield sign + line
+            else:
+                hidden += 1
+        i += skip[0]
+        j += skip[1]
+
+    if equal:
+        yield '  [%d equal lines]\n' % equal
+    if hidden:
+        yield '  [%d more differing lines]\n' % hidden
+
+
+def print_diff(res_txt, exp_txt):
+    """
+    prints the differences between a generated and the expected output
+    """
+    res_lines = res_txt.splitlines(True)
+    exp_lines = exp_txt.splitlines(True)
+
+    if max(len(res_lines), len(exp_lines)) <= MAX_NDIFF_LINES:
+        file_diff = difflib.ndiff(res_lines, exp_lines)
     else:
-        eprint("is not a file: %s" % fp)
+        file_diff = diff_lines_linear(res_lines, exp_lines)
 
-    return out
+    printer = pprint.PrettyPrinter(indent=4)
+    for line in file_diff:
+        printer.pprint(line)
 
 
 def check_generated_output(gen_expected_path, gen_result_path,
@@ -165,22 +305,18 @@ def check_generated_output(gen_expected_path, gen_result_path,
     True
     """
 
-    gen_exp_txt = get_file_content(gen_expected_path)
-    if gen_exp_txt is None:
+    gen_exp = get_file_bytes(gen_expected_path)
+    if gen_exp is None:
         return False
 
-    gen_res_txt = get_file_content(gen_result_path)
-    if gen_res_txt is None:
+    gen_res = get_file_bytes(gen_result_path)
+    if gen_res is None:
         return False
 
-    if result_manip is not None:
-        if type(result_manip) is list or type(result_manip) is tuple:
-            for m in result_manip:
-                gen_res_txt = m(gen_res_txt)
-        else:
-            gen_res_txt = result_manip(gen_res_txt)
+    mismatch = compare_output(gen_res, gen_exp, result_manip)
+    if mismatch is not None:
+        gen_res_txt, gen_exp_txt = mismatch
 
-    if gen_res_txt != gen_exp_txt:
         with open(gen_result_path, 'w', encoding="utf-8", newline="") as f:
             f.write(gen_res_txt)
 
@@ -192,11 +328,7 @@ def check_generated_output(gen_expected_path, gen_result_path,
             print("Problem with %s" % gen_result_path)
             print("************************************")
 
-            file_diff = difflib.ndiff(gen_res_txt.splitlines(True),
-                                      gen_exp_txt.splitlines(True))
-
-            for line in file_diff:
-                pprint.PrettyPrinter(indent=4).pprint(line)
+            print_diff(gen_res_txt, gen_exp_txt)
 
             return False
         else:
@@ -224,8 +356,8 @@ def check_std_output(expected_path, result_path, result_str, result_manip=None,
     :param result_path: string
         path to which the Uncrustifys output will be saved in case of a mismatch
 
-    :param result_str: string (utf8)
-        the output string generated by Uncrustify
+    :param result_str: bytes
+        the output generated by Uncrustify
 
     :param result_manip: lambda OR list or tuple of lambdas
         see result_manip for check_generated_output
@@ -239,18 +371,14 @@ def check_std_output(expected_path, result_path, result_str, result_manip=None,
     True or False depending on whether both files have the same content
 
     """
-    exp_txt = get_file_content(expected_path)
-    if exp_txt is None:
+    exp = get_file_bytes(expected_path)
+    if exp is None:
         return False
 
-    if result_manip is not None:
-        if type(result_manip) is list or type(result_manip) is tuple:
-            for m in result_manip:
-                result_str = m(result_str)
-        else:
-            result_str = result_manip(result_str)
+    mismatch = compare_output(result_str, exp, result_manip)
+    if mismatch is not None:
+        result_str, exp_txt = mismatch
 
-    if result_str != exp_txt:
         with open(result_path, 'w', encoding="utf-8", newline="\n") as f:
             f.write(result_str)
 
@@ -263,11 +391,7 @@ def check_std_output(expected_path, result_path, result_str, result_manip=None,
             print("Problem with %s" % result_path)
             print("************************************")
 
-            file_diff = difflib.ndiff(result_str.splitlines(True),
-                                      exp_txt.splitlines(True))
-
-            for line in file_diff:
-                pprint.PrettyPrinter(indent=4).pprint(line)
+            print_diff(result_str, exp_txt)
         else:
             print("\nProblem with %s" % result_path)
             print("use: '--diff' to find out why %s %s are different"
@@ -459,6 +583,254 @@ def s_path_join(path, *paths):
     return path_join(*p_splits)
 
 
+def cli_cases(script_dir):
+    """
+    returns the table of the test cases, in the order they are reported
+
+
+    Parameters
+    ----------------------------------------------------------------------------
+    :param script_dir: string
+        path of the directory containing this script
+
+
+    :return: list of dicts
+    ----------------------------------------------------------------------------
+        each case has a unique 'name', optionally a 'setup' function that is
+        called before it is run and a 'posix_only' flag, all other items are
+        keyword arguments of check_uncrustify_output
+    """
+    def p(path):
+        return s_path_join(script_dir, path)
+
+    def reset_backup():
+        copyfile(p('input/backup.h-save'), p('input/backup.h'))
+
+    cases = [
+        #
+        # Test help
+        #   -h -? --help --usage
+        dict(name='help',
+             out_expected_path=p('output/help.txt'),
+             out_result_path=p('results/help.txt'),
+             out_result_manip=[
+                 string_replace(' --mtime      : Preserve mtime on replaced files.\n', ''),
+                 string_replace('.exe', ''),
+                 reg_replace(r'currently \d+ options', 'currently x options')
+             ]),
+
+        #
+        # Test false parameter
+        #   --xyz
+        dict(name='xyz',
+             args_arr=['--xyz'],
+             err_expected_path=p('output/xyz-err.txt'),
+             err_result_path=p('results/xyz-err.txt')),
+
+        #
+        # Test Version
+        #   -v
+        dict(name='version',
+             args_arr=['-v'],
+             out_expected_path=p('output/v-out.txt'),
+             out_result_path=p('results/v-out.txt'),
+             out_result_manip=reg_replace(r'Uncrustify.+', 'Uncrustify')),
+
+        #
+        # Test --show-config
+        #
+        dict(name='show_config',
+             args_arr=['--show-config'],
+             out_expected_path=p('output/show_config.txt'),
+             out_result_path=p('results/show_config.txt'),
+             out_result_manip=reg_replace(r'\# Uncrustify.+', '')),
+    ]
+
+    #
+    # Test --update-config and --update-config-with-doc
+    #
+    error_index = 0
+    for option, suffix in (('--update-config', 'uc'),
+                           ('--update-config-with-doc', 'ucwd')):
+        for cfg in ('mini_d', 'mini_nd'):
+            cases.append(dict(
+                name='%s_%s' % (cfg, suffix),
+                args_arr=['-c', p('config/%s.cfg' % cfg), option],
+                out_expected_path=p('output/%s_%s.txt' % (cfg, suffix)),
+                out_result_path=p('results/%s_%s.txt' % (cfg, suffix)),
+                out_result_manip=reg_replace(r'\# Uncrustify.+', ''),
+                err_expected_path=p('output/mini_d_error.txt'),
+                err_result_path=p('results/mini_d_error%d.txt' % error_index),
+                err_result_manip=string_replace('\\', '/')))
+            error_index += 1
+
+    cases += [
+        #
+        # Test -p
+        #
+        dict(name='p',
+             posix_only=True,
+             args_arr=['-c', p('config/mini_nd.cfg'),
+                       '-f', p('input/testSrcP.cpp'),
+                       '-p', p('results/p.txt')],
+             gen_expected_path=p('output/p.txt'),
+             gen_result_path=p('results/p.txt'),
+             gen_result_manip=reg_replace(r'\# Uncrustify.+[^\n\r]', '')),
+
+        #
+        # Test -p and -c with '-' input
+        #
+        dict(name='pc-',
+             posix_only=True,
+             args_arr=['-c', '-',
+                       '-f', NULL_DEVICE,
+                       '-p', '-'],
+             out_expected_path=p('output/pc-.txt'),
+             out_result_manip=reg_replace(r'\# Uncrustify.+[^\n\r]', ''),
+             out_result_path=p('results/pc-.txt')),
+
+        #
+        # Test --replace
+        #
+        dict(name='replace',
+             setup=reset_backup,
+             args_arr=['-c', p('config/replace.cfg'),
+                       '-F', p('input/replace.list'),
+                       '--replace'],
+             gen_expected_path=p('output/backup.h'),
+             gen_result_path=p('input/backup.h')),
+
+        # The flag CMAKE_BUILD_TYPE must be set to "Release", or all lines with
+        # 'Description="<html>(<number>)text abc.</html>" must be changed to
+        # 'Description="<html>text abc.</html>"
+        #
+        # OR it is possible to introduce a new parameter: gen_expected_manip
+        #
+        # The last "reg_replace(r'\r', '')" is necessary under Windows, because
+        # fprintf puts a \r\n at the end of a line. To make the check, we use
+        # output/universalindent.cfg, generated under Linux, with only \n at the
+        # end of a line.
+        dict(name='universalindent',
+             args_arr=['-o', p('results/universalindent.cfg'),
+                       '--universalindent'],
+             gen_expected_path=p('output/universalindent.cfg'),
+             gen_result_path=p('results/universalindent.cfg'),
+             gen_result_manip=[reg_replace(r'version=U.+', ''),
+                               reg_replace(r'\(\d+\)', ''),
+                               reg_replace(r'\r', '')]),
+    ]
+
+    # Debug Options:
+    #   -L
+    # look at src/log_levels.h
+    Ls_A = ['9', '21', '25', '28', '31', '36', '66', '92']
+    for L in Ls_A:
+        cases.append(dict(
+            name='L%s' % L,
+            args_arr=['-c', NULL_DEVICE, '-L', L, '-o', NULL_DEVICE,
+                      '-f', p('input/testSrc.cpp')],
+            err_expected_path=p('output/%s.txt' % L),
+            err_result_path=p('results/%s.txt' % L),
+            err_result_manip=[reg_replace(r'\([0-9]+\)', ' '),
+                              reg_replace(r'\[line [0-9]+', '[ '),
+                              reg_replace(RE_CALLSTACK, '[CallStack]'),
+                              reg_replace(RE_DO_SPACE, '')]))
+
+    # Test logger buffer overflow
+    cases.append(dict(
+        name='logger_cs_L_99',
+        args_arr=['-c', NULL_DEVICE, '-L', '99', '-o', NULL_DEVICE,
+                  '-f', p('input/logger.cs')],
+        err_expected_path=p('output/logger_cs_L_99.txt'),
+        err_result_path=p('results/logger_cs_L_99.txt'),
+        err_result_manip=reg_replace(r'[0-9]', '')))
+
+    # misc error_tests
+    error_tests = ["I-842", "unmatched_close_pp"]
+    for test in error_tests:
+        cases.append(dict(
+            name=test,
+            args_arr=['-c', p('config/%s.cfg' % test),
+                      '-f', p('input/%s.cpp' % test),
+                      '-o', NULL_DEVICE, '-q'],
+            err_expected_path=p('output/%s.txt' % test),
+            err_result_path=p('results/%s.txt' % test)))
+
+    return cases
+
+
+class OutputCapture(object):
+    """
+    file like object that collects everything written to it
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, text):
+        self.parts.append(text)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return ''.join(self.parts)
+
+
+# state of the process running the test cases, see init_case_runner
+case_runner = {}
+
+
+def init_case_runner(uncr_bin, script_dir, program_args):
+    """
+    prepares the current process to run test cases with run_case
+
+    The case table is built by every worker process itself, as the result
+    manipulators it contains can not be passed between processes.
+    """
+    case_runner['uncr_bin'] = uncr_bin
+    case_runner['program_args'] = program_args
+    case_runner['cases'] = dict((c['name'], c) for c in cli_cases(script_dir))
+
+
+def run_case(name):
+    """
+    runs a single test case of the table
+
+
+    Parameters
+    ----------------------------------------------------------------------------
+    :param name: string
+        name of the case
+
+
+    :return: string, bool, string
+    ----------------------------------------------------------------------------
+        the name of the case, whether it passed, and everything that was
+        printed while running it
+    """
+    kwargs = dict(case_runner['cases'][name])
+    del kwargs['name']
+    kwargs.pop('posix_only', None)
+    setup = kwargs.pop('setup', None)
+
+    # check_uncrustify_output stores the --apply target in program_args
+    program_args = copy(case_runner['program_args'])
+
+    capture = OutputCapture()
+    saved = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = capture
+    try:
+        if setup is not None:
+            setup()
+        passed = check_uncrustify_output(case_runner['uncr_bin'],
+                                         program_args, **kwargs)
+    finally:
+        sys.stdout, sys.stderr = saved
+
+    return name, passed, capture.getvalue()
+
+
 def main(args):
     # set working dir to script dir
     script_dir = dirname(relpath(__file__))
@@ -471,8 +843,31 @@ def main(args):
     parser.add_argument('--build',
                         default=s_path_join(script_dir, '../../build'),
                         help='specify location of the build directory')
-
-    parsed_args = parser.parse_args()
+    parser.add_argument('-j', '--jobs', type=int, default=cpu_count(),
+                        help='number of test cases to run concurrently')
+    parser.add_argument('--list', action='store_true',
+                        help='list the names of the test cases and exit')
+    parser.add_argument('cases', nargs='*', metavar='CASE',
+                        help='names (or fnmatch patterns) of the test cases '
+                             'to run, default: all')
+
+    parsed_args = parser.parse_args(args)
+
+    cases = [c['name'] for c in cli_cases(script_dir)
+             if os_name != 'nt' or not c.get('posix_only')]
+    if parsed_args.cases:
+        selected = [n for n in cases
+                    if any(fnmatchcase(n, pattern)
+                           for pattern in parsed_args.cases)]
+        for pattern in parsed_args.cases:
+            if not any(fnmatchcase(n, pattern) for n in cases):
+                eprint("No test case matches: %s" % pattern)
+                sys_exit(EX_USAGE)
+        cases = selected
+
+    if parsed_args.list:
+        print('\n'.join(cases))
+        sys_exit(EX_OK)
 
     # find the uncrustify binary
     bin_found = False
@@ -500,236 +895,30 @@ def main(args):
 
     clear_dir(s_path_join(script_dir, "./results"))
 
-    return_flag = True
-
-    #
-    # Test help
-    #   -h -? --help --usage
-    if not check_uncrustify_output(
-            uncr_bin,
-            parsed_args,
-            out_expected_path=s_path_join(script_dir, 'output/help.txt'),
-            out_result_path=s_path_join(script_dir, 'results/help.txt'),
-            out_result_manip=[
-                string_replace(' --mtime      : Preserve mtime on replaced files.\n', ''),
-                string_replace('.exe', ''),
-                reg_replace(r'currently \d+ options', 'currently x options')
-            ]):
-        return_flag = False
-
-    #
-    # Test false parameter
-    #   --xyz
-    if not check_uncrustify_output(
-            uncr_bin,
-            parsed_args,
-            args_arr=['--xyz'],
-            err_expected_path=s_path_join(script_dir, 'output/xyz-err.txt'),
-            err_result_path=s_path_join(script_dir, 'results/xyz-err.txt')
-            ):
-        return_flag = False
-
-    #
-    # Test Version
-    #   -v
-    if not check_uncrustify_output(
-            uncr_bin,
-            parsed_args,
-            args_arr=['-v'],
-            out_expected_path=s_path_join(script_dir, 'output/v-out.txt'),
-            out_result_path=s_path_join(script_dir, 'results/v-out.txt'),
-            out_result_manip=reg_replace(r'Uncrustify.+', 'Uncrustify')
-            ):
-        return_flag = False
-
-    #
-    # Test --show-config
-    #
-    if not check_uncrustify_output(
-            uncr_bin,
-            parsed_args,
-            args_arr=['--show-config'],
-            out_expected_path=s_path_join(script_dir, 'output/show_config.txt'),
-            out_result_path=s_path_join(script_dir, 'results/show_config.txt'),
-            out_result_manip=reg_replace(r'\# Uncrustify.+', '')
-            ):
-        return_flag = False
-
-    #
-    # Test --update-config
-    #
-    if not check_uncrustify_output(
-            uncr_bin,
-            parsed_args,
-            args_arr=['-c', s_path_join(script_dir, 'config/mini_d.cfg'),
-                      '--update-config'],
-            out_expected_path=s_path_join(script_dir, 'output/mini_d_uc.txt'),
-            out_result_path=s_path_join(script_dir, 'results/mini_d_uc.txt'),
-            out_result_manip=reg_replace(r'\# Uncrustify.+', ''),
-            err_expected_path=s_path_join(script_dir, 'output/mini_d_error.txt'),
-            err_result_path=s_path_join(script_dir, 'results/mini_d_error0.txt'),
-            err_result_manip=string_replace('\\', '/')
-            ):
-        return_flag = False
-
-    if not check_uncrustify_output(
-            uncr_bin,
-            parsed_args,
-            args_arr=['-c', s_path_join(script_dir, 'config/mini_nd.cfg'),
-                      '--update-config'],
-            out_expected_path=s_path_join(script_dir, 'output/mini_nd_uc.txt'),
-            out_result_path=s_path_join(script_dir, 'results/mini_nd_uc.txt'),
-            out_result_manip=reg_replace(r'\# Uncrustify.+', ''),
-            err_expected_path=s_path_join(script_dir, 'output/mini_d_error.txt'),
-            err_result_path=s_path_join(script_dir, 'results/mini_d_error1.txt'),
-            err_result_manip=string_replace('\\', '/')
-            ):
-        return_flag = False
-
-    #
-    # Test --update-config-with-doc
-    #
-    if not check_uncrustify_output(
-            uncr_bin,
-            parsed_args,
-            args_arr=['-c', s_path_join(script_dir, 'config/mini_d.cfg'),
-                      '--update-config-with-doc'],
-            out_expected_path=s_path_join(script_dir, 'output/mini_d_ucwd.txt'),
-            out_result_path=s_path_join(script_dir, 'results/mini_d_ucwd.txt'),
-            out_result_manip=reg_replace(r'\# Uncrustify.+', ''),
-            err_expected_path=s_path_join(script_dir, 'output/mini_d_error.txt'),
-            err_result_path=s_path_join(script_dir, 'results/mini_d_error2.txt'),
-            err_result_manip=string_replace('\\', '/')
-            ):
-        return_flag = False
-
-    if not check_uncrustify_output(
-            uncr_bin,
-            parsed_args,
-            args_arr=['-c', s_path_join(script_dir, 'config/mini_nd.cfg'),
-                      '--update-config-with-doc'],
-            out_expected_path=s_path_join(script_dir, 'output/mini_nd_ucwd.txt'),
-            out_result_path=s_path_join(script_dir, 'results/mini_nd_ucwd.txt'),
-            out_result_manip=reg_replace(r'\# Uncrustify.+', ''),
-            err_expected_path=s_path_join(script_dir, 'output/mini_d_error.txt'),
-            err_result_path=s_path_join(script_dir, 'results/mini_d_error3.txt'),
-            err_result_manip=string_replace('\\', '/')
-            ):
-        return_flag = False
-
-    #
-    # Test -p
-    #
-    if os_name != 'nt':
-        if not check_uncrustify_output(
-                uncr_bin,
-                parsed_args,
-                args_arr=['-c', s_path_join(script_dir, 'config/mini_nd.cfg'),
-                          '-f', s_path_join(script_dir, 'input/testSrcP.cpp'),
-                          '-p', s_path_join(script_dir, 'results/p.txt')],
-                gen_expected_path=s_path_join(script_dir, 'output/p.txt'),
-                gen_result_path=s_path_join(script_dir, 'results/p.txt'),
-                gen_result_manip=reg_replace(r'\# Uncrustify.+[^\n\r]', '')
-                ):
-            return_flag = False
-            
-    #
-    # Test -p and -c with '-' input
-    #
-    if os_name != 'nt' and not check_uncrustify_output(
-            uncr_bin,
-            parsed_args,
-            args_arr=['-c', '-',
-                      '-f', NULL_DEVICE,
-                      '-p', '-'],
-            out_expected_path=s_path_join(script_dir, 'output/pc-.txt'),
-            out_result_manip=reg_replace(r'\# Uncrustify.+[^\n\r]', ''),
-            out_result_path=s_path_join(script_dir, 'results/pc-.txt')
-            ):
-        return_flag = False
-
-    #
-    # Test --replace
-    #
-    copyfile("input/backup.h-save", "input/backup.h")
-    if not check_uncrustify_output(
-            uncr_bin,
-            parsed_args,
-            args_arr=['-c', s_path_join(script_dir, 'config/replace.cfg'),
-                      '-F', s_path_join(script_dir, 'input/replace.list'),
-                      '--replace'],
-            gen_expected_path=s_path_join(script_dir, 'output/backup.h'),
-            gen_result_path=s_path_join(script_dir, 'input/backup.h')
-            ):
-        return_flag = False
-
-    # The flag CMAKE_BUILD_TYPE must be set to "Release", or all lines with
-    # 'Description="<html>(<number>)text abc.</html>" must be changed to
-    # 'Description="<html>text abc.</html>"
-    #
-    # OR it is possible to introduce a new parameter: gen_expected_manip
-    #
-    # The last "reg_replace(r'\r', '')" is necessary under Windows, because
-    # fprintf puts a \r\n at the end of a line. To make the check, we use
-    # output/universalindent.cfg, generated under Linux, with only \n at the
-    # end of a line.
-    if not check_uncrustify_output(
-            uncr_bin,
-            parsed_args,
-            args_arr=['-o', s_path_join(script_dir, 'results/universalindent.cfg'),
-                      '--universalindent'],
-            gen_expected_path=s_path_join(script_dir, 'output/universalindent.cfg'),
-            gen_result_path=s_path_join(script_dir, 'results/universalindent.cfg'),
-            gen_result_manip=[reg_replace(r'version=U.+', ''),
-                              reg_replace(r'\(\d+\)', ''),
-                              reg_replace(r'\r', '')]
-            ):
-        return_flag = False
-
-    # Debug Options:
-    #   -L
-    # look at src/log_levels.h
-    Ls_A = ['9', '21', '25', '28', '31', '36', '66', '92']
-    for L in Ls_A:
-        if not check_uncrustify_output(
-                uncr_bin,
-                parsed_args,
-                args_arr=['-c', NULL_DEVICE, '-L', L, '-o', NULL_DEVICE,
-                          '-f', s_path_join(script_dir, 'input/testSrc.cpp')],
-                err_expected_path=s_path_join(script_dir, 'output/%s.txt' % L),
-                err_result_path=s_path_join(script_dir, 'results/%s.txt' % L),
-                err_result_manip=[reg_replace(r'\([0-9]+\)', ' '),
-                                  reg_replace(r'\[line [0-9]+', '[ '),
-                                  reg_replace(RE_CALLSTACK, '[CallStack]'),
-                                  reg_replace(RE_DO_SPACE, '')]
-            ):
-            return_flag = False
-
-    # Test logger buffer overflow
-    if not check_uncrustify_output(
-            uncr_bin,
-            parsed_args,
-            args_arr=['-c', NULL_DEVICE, '-L', '99', '-o', NULL_DEVICE,
-                      '-f', s_path_join(script_dir, 'input/logger.cs')],
-            err_expected_path=s_path_join(script_dir, 'output/logger_cs_L_99.txt'),
-            err_result_path=s_path_join(script_dir, 'results/logger_cs_L_99.txt'),
-            err_result_manip=reg_replace(r'[0-9]', '')
-            ):
-        return_flag = False
+    # Every case writes its own result files, so they can run concurrently;
+    # their output is collected and printed in the order of the case table
+    runner_args = (uncr_bin, script_dir, parsed_args)
+    jobs = max(1, min(parsed_args.jobs, len(cases)))
+    if jobs == 1:
+        init_case_runner(*runner_args)
+        results = map(run_case, cases)
+        pool = None
+    else:
+        pool = Pool(jobs, init_case_runner, runner_args)
+        results = pool.imap(run_case, cases)
 
-    # misc error_tests
-    error_tests = ["I-842", "unmatched_close_pp"]
-    for test in error_tests:
-        if not check_uncrustify_output(
-                uncr_bin,
-                parsed_args,
-                args_arr=['-c', s_path_join(script_dir, 'config/%s.cfg' % test),
-                          '-f', s_path_join(script_dir, 'input/%s.cpp' % test),
-                          '-o', NULL_DEVICE, '-q'],
-                err_expected_path=s_path_join(script_dir, 'output/%s.txt' % test),
-                err_result_path=s_path_join(script_dir, 'results/%s.txt' % test)
-                ):
-            return_flag = False
+    return_flag = True
+    try:
+        for name, passed, output in results:
+            if output:
+                print(output, end='')
+                sys.stdout.flush()
+            if not passed:
+                return_flag = False
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
 
     if return_flag:
         print("all tests are OK")
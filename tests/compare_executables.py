@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+#
+# Compares two uncrustify executables over the format tests: reports the
+# tests for which their outputs differ, and how long the candidate takes
+# relative to the baseline, per test and overall, with 95% confidence
+# intervals from repeated runs.
+#
+
+import argparse
+import json
+import math
+import os
+import sys
+
+from multiprocessing.pool import ThreadPool
+
+import test_uncrustify as tu
+
+from test_uncrustify.config import FAIL_ATTRS, PASS_ATTRS
+
+
+# -----------------------------------------------------------------------------
+def format_ratio(ratio):
+    value, low, high = ratio
+    if low is None:
+        return '{:.3f}'.format(value)
+    return '{:.3f} [{:.3f}, {:.3f}]'.format(value, low, high)
+
+
+# -----------------------------------------------------------------------------
+def describe(run):
+    if run['returncode'] is None:
+        return 'timed out'
+    if run['returncode'] != 0:
+        return 'error code {}'.format(run['returncode'])
+    return 'matches expected' if run['matches'] else 'differs from expected'
+
+
+# -----------------------------------------------------------------------------
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Compare the output and speed of two uncrustify '
+                    'executables over the format tests')
+    parser.add_argument('baseline', metavar='BASELINE', type=str,
+                        help='uncrustify executable to compare against')
+    parser.add_argument('candidate', metavar='CANDIDATE', type=str,
+                        help='uncrustify executable to compare')
+    parser.add_argument('tests', metavar='TEST', type=str, nargs='*',
+                        default=tu.all_tests,
+                        help='test(s) to run (default all)')
+    parser.add_argument('-r', '--select', metavar='CASE(S)', type=str,
+                        help='select tests to be executed')
+    parser.add_argument('-n', '--repeat', type=int, default=5,
+                        help='number of times each executable runs each '
+                             'test (default 5)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of tests to run concurrently; timings '
+                             'are noisier when the tests compete for the '
+                             'processors')
+    parser.add_argument('--timeout', type=float, default=300,
+                        metavar='SECONDS',
+                        help='time after which a run is killed '
+                             '(0 for no limit)')
+    parser.add_argument('--top', type=int, default=10, metavar='N',
+                        help='number of the tests with the highest and the '
+                             'lowest time ratios to show (default 10)')
+    parser.add_argument('--json', type=str, metavar='FILE',
+                        help='write the record of every test to FILE')
+    args = parser.parse_args(argv[1:])
+
+    for exe in (args.baseline, args.candidate):
+        if not os.path.exists(exe):
+            tu.printc('FAILED: ', 'Specified uncrustify executable {!r} '
+                      'does not exist'.format(exe), **FAIL_ATTRS)
+            sys.exit(-1)
+
+    # Read tests
+    tests = []
+    for group in args.tests:
+        tests_file = os.path.join(tu.test_dir, '{}.test'.format(group))
+        tests += tu.read_format_tests(tests_file, group)
+    if args.select:
+        s = tu.Selector(args.select)
+        tests = [t for t in tests if s.test(t.test_name)]
+
+    # Run tests
+    pool = ThreadPool(max(1, args.jobs))
+    try:
+        records = pool.map(
+            lambda test: tu.compare_test(test, args.baseline, args.candidate,
+                                         max(1, args.repeat), args.timeout),
+            tests)
+    finally:
+        pool.close()
+        pool.join()
+
+    # Report differences
+    timeouts = [r for r in records if r['timeout']]
+    different = [r for r in records if not r['same'] and not r['timeout']]
+    regressions = [r for r in different
+                   if r['baseline']['matches'] and
+                   not r['candidate']['matches']]
+
+    for r in timeouts:
+        tu.printc('TIMEOUT: ', r['name'], **FAIL_ATTRS)
+    for r in different:
+        tu.printc('DIFFERS: ', '{} (baseline {}, candidate {})'.format(
+            r['name'], describe(r['baseline']), describe(r['candidate'])),
+            **FAIL_ATTRS)
+
+    # Report speed
+    timed = [r for r in records if r['ratio'] is not None]
+    if timed:
+        timed.sort(key=lambda r: r['ratio'][0])
+        top = min(args.top, len(timed) // 2)
+        if top > 0:
+            print('Highest time ratios candidate / baseline (95% CI):')
+            for r in timed[:-top - 1:-1]:
+                print('  {:<24} {}'.format(r['name'],
+                                           format_ratio(r['ratio'])))
+            print('Lowest time ratios:')
+            for r in timed[:top]:
+                print('  {:<24} {}'.format(r['name'],
+                                           format_ratio(r['ratio'])))
+
+        slower = sum(1 for r in timed
+                     if r['ratio'][1] is not None and r['ratio'][1] > 1)
+        faster = sum(1 for r in timed
+                     if r['ratio'][2] is not None and r['ratio'][2] < 1)
+        overall = tu.ratio_interval([math.log(r['ratio'][0]) for r in timed])
+        total = (sum(sum(r['candidate']['times']) for r in timed) /
+                 sum(sum(r['baseline']['times']) for r in timed))
+
+        print('Time ratio candidate / baseline over {} tests: {} '
+              '(geometric mean, 95% CI), {:.3f} in total'.format(
+                  len(timed), format_ratio(overall), total))
+        print('  significantly slower: {} tests, faster: {} tests'.format(
+            slower, faster))
+
+    if args.json:
+        with open(args.json, 'wt') as f:
+            json.dump(records, f, indent=1)
+
+    if different or timeouts:
+        tu.printc('{} / {} tests produced the same output'.format(
+            len(records) - len(different) - len(timeouts), len(records)),
+            **FAIL_ATTRS)
+        if regressions:
+            tu.printc('{} tests no longer match the expected output'.format(
+                len(regressions)), **FAIL_ATTRS)
+        sys.exit(1)
+
+    tu.printc('{0} / {0} tests produced the same output'.format(len(records)),
+              **PASS_ATTRS)
+
+
+# %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+#
+# Combines the result files written by 'run_format_tests.py --shard I/N' (or
+# --write-results) and prints the summary of the whole run.
+#
+
+import argparse
+import sys
+
+import test_uncrustify as tu
+
+from test_uncrustify.config import FAIL_ATTRS
+
+
+# -----------------------------------------------------------------------------
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Merge uncrustify format test results')
+    parser.add_argument('results', metavar='FILE', type=str, nargs='+',
+                        help='result file of a shard')
+    parser.add_argument('--timings', type=str, metavar='FILE',
+                        help='also record the durations and failures of the '
+                             'merged run in this timings file, e.g. the one '
+                             'used to balance the next shards')
+    parser.add_argument('--junit', type=str, metavar='FILE',
+                        help='also write the merged results to FILE as a '
+                             'JUnit XML report')
+    args = parser.parse_args(argv[1:])
+
+    records, problems = tu.read_results(args.results)
+    for problem in problems:
+        tu.printc('ERROR: ', problem, **FAIL_ATTRS)
+
+    for record in records:
+        if record['outcome'] != 'passing':
+            tu.printc('{}: '.format(record['outcome'].upper()),
+                      record['name'], **FAIL_ATTRS)
+
+    counts = tu.count_outcomes(records)
+    tu.report(counts)
+
+    if args.timings:
+        timings = tu.Timings(args.timings)
+        for record in records:
+            timings.record(record['name'], record['duration'],
+                           record['outcome'] != 'passing')
+        timings.save()
+
+    if args.junit:
+        tu.write_junit(args.junit, records)
+
+    if problems or counts['failing'] > 0 or counts['timeout'] > 0:
+        sys.exit(2)
+    if counts['mismatch'] > 0 or counts['unstable'] > 0:
+        sys.exit(1)
+
+
+# %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
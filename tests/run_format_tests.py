@@ -43,10 +43,69 @@ def main(argv):
         else:
             s = None
 
-        counts = tu.run_tests(tests, args, s)
+        if args.write_coverage_index:
+            counts = tu.write_coverage_index(args.write_coverage_index,
+                                             tests, args)
+            tu.report(counts)
+            return
+
+        if args.changed_since:
+            paths = tu.changed_files(args.changed_since)
+
+            # With a coverage index, changes to src/*.cpp select the tests
+            # that executed the changed functions, instead of all tests
+            src_paths = []
+            if args.coverage_index:
+                src_paths = [p for p in paths
+                             if p.startswith('src/') and p.endswith('.cpp')]
+            other_paths = [p for p in paths if p not in src_paths]
+
+            affected = tu.affected_tests(tu.build_file_index(tests),
+                                         other_paths)
+            if affected is not None and src_paths:
+                index = tu.read_coverage_index(args.coverage_index)
+                covered, stale = tu.covered_tests_since(
+                    index, args.changed_since, src_paths)
+                if stale:
+                    print('Coverage index built at {} from other versions '
+                          'of {} than {}'.format(index['commit'],
+                                                 ', '.join(stale),
+                                                 args.changed_since))
+                affected = None if covered is None else affected | covered
+
+            if affected is None:
+                print('Changed since {}: {} files, including sources of '
+                      'uncrustify; running all tests'.format(
+                          args.changed_since, len(paths)))
+            else:
+                tests = [t for t in tests if t.test_name in affected]
+                print('Changed since {}: {} files, affecting {} tests'.format(
+                    args.changed_since, len(paths), len(tests)))
+
+        results_path = args.write_results
+        if args.shard:
+            index, count = tu.parse_shard(args.shard)
+            timings = tu.Timings(args.timings) if args.timings else None
+            tests = tu.shard_tests(tests, index, count, timings)
+
+            # Every shard must be cut from the same timings, so the shards
+            # record their own in the result directory instead
+            args.timings = None
+            print('Shard {}: {} tests'.format(args.shard, len(tests)))
+            if results_path is None:
+                results_path = os.path.join(
+                    args.result_dir, 'shard-{}-of-{}.json'.format(index, count))
+
+        results = []
+        counts = tu.run_tests(tests, args, s, results)
         tu.report(counts)
 
-        if counts['failing'] > 0:
+        if results_path:
+            tu.write_results(results_path, args.shard, results)
+        if args.junit:
+            tu.write_junit(args.junit, results)
+
+        if counts['failing'] > 0 or counts['timeout'] > 0:
             sys.exit(2)
         if counts['mismatch'] > 0 or counts['unstable'] > 0:
             sys.exit(1)
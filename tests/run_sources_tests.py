@@ -2,15 +2,76 @@
 #
 # Checks the formatting of uncrustify's own sources.
 #
+# The sources are split into batches of about the same size, which are
+# checked concurrently by instances of uncrustify running in --check mode over
+# a list of files. Only the files that fail the check are then run as
+# individual tests, to show their differences and keep their results.
+#
 # * @author  Matthew Woehlke    June 2018
 #
 
 import argparse
 import os
+import re
+import subprocess
 import sys
 
+from multiprocessing.pool import ThreadPool
+
 import test_uncrustify as tu
 
+from test_uncrustify.config import PASS_ATTRS
+from test_uncrustify.test import _kill_process_group, _start_process_group
+
+re_pass = re.compile(r'^PASS: (.*) \(\d+ bytes\)$')
+
+
+# -----------------------------------------------------------------------------
+def make_batches(paths, count):
+    # Largest files first, each to the batch with the fewest bytes so far
+    batches = [[] for _ in range(count)]
+    sizes = [0] * count
+    for path in sorted(paths, key=lambda p: -os.path.getsize(p)):
+        i = sizes.index(min(sizes))
+        batches[i].append(path)
+        sizes[i] += os.path.getsize(path)
+    return [b for b in batches if b]
+
+
+# -----------------------------------------------------------------------------
+def check_batch(paths, config, args):
+    # Returns the paths that passed the check; a batch that times out or
+    # fails to run reports no path as passed, leaving all of them to be
+    # tested individually
+    cmd = [
+        tu.config.uncrustify_exe,
+        '-q',
+        '-l', 'CPP',
+        '-c', config,
+        '--check',
+        '-F', '-'
+    ]
+    if args.show_commands:
+        tu.printc('RUN: ', repr(cmd))
+
+    proc = _start_process_group(cmd, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+    try:
+        output, _ = proc.communicate(
+            '\n'.join(paths).encode('utf-8'), timeout=args.timeout or None)
+    except subprocess.TimeoutExpired:
+        _kill_process_group(proc)
+        proc.communicate()
+        return set()
+
+    passed = set()
+    for line in output.decode('utf-8', 'replace').splitlines():
+        match = re_pass.match(line)
+        if match:
+            passed.add(os.path.normpath(match.group(1)))
+    return passed
+
 
 # -----------------------------------------------------------------------------
 def main(argv):
@@ -23,20 +84,49 @@ def main(argv):
     src_dir = os.path.join(root, 'src')
     config = os.path.join(root, 'forUncrustifySources.cfg')
 
-    # Create tests
+    sources = sorted(os.path.join(src_dir, s) for s in os.listdir(src_dir)
+                     if os.path.splitext(s)[1] in ('.cpp', '.h'))
+
+    if args.changed_since:
+        changed = set(os.path.normpath(os.path.join(root, p))
+                      for p in tu.changed_files(args.changed_since))
+        if config not in changed:
+            sources = [s for s in sources if s in changed]
+        print('Changed since {}: checking {} files'.format(
+            args.changed_since, len(sources)))
+
+    # Check the sources in batches
+    jobs = max(1, min(args.jobs, len(sources)))
+    passed = set()
+    pool = ThreadPool(jobs)
+    try:
+        for batch_passed in pool.imap_unordered(
+                lambda batch: check_batch(batch, config, args),
+                make_batches(sources, jobs)):
+            passed |= batch_passed
+    finally:
+        pool.close()
+        pool.join()
+
+    if args.show_all:
+        for s in sources:
+            if s in passed:
+                tu.printc('PASSED: ', os.path.basename(s), **PASS_ATTRS)
+
+    # Test the files that did not pass individually
     tests = []
-    for s in os.listdir(src_dir):
-        if os.path.splitext(s)[1] in ('.cpp', '.h'):
+    for filepath in sources:
+        if filepath not in passed:
             t = tu.SourceTest()
-            filepath = os.path.join(src_dir, s)
             t.build(test_input=filepath, test_lang='CPP', test_config=config,
                     test_expected=filepath)
             tests.append(t)
 
     counts = tu.run_tests(tests, args)
+    counts['passing'] += len(sources) - len(tests)
     tu.report(counts)
 
-    if counts['failing'] > 0:
+    if counts['failing'] > 0 or counts['timeout'] > 0:
         sys.exit(2)
     if counts['mismatch'] > 0:
         sys.exit(1)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+#
+# Tests of the test harness (the test_uncrustify package) itself.
+#
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import test_uncrustify as tu
+
+from test_uncrustify.timings import RECENT_RUNS
+
+
+# =============================================================================
+class Test(object):
+    # Stands in for a test, as far as the timings are concerned
+    # -------------------------------------------------------------------------
+    def __init__(self, name):
+        self.test_name = name
+
+
+# =============================================================================
+class TimingsTest(unittest.TestCase):
+    # -------------------------------------------------------------------------
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='uncrustify-harness-')
+        self.path = os.path.join(self.dir, 'timings.json')
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    # -------------------------------------------------------------------------
+    def run_group(self, outcomes):
+        # Records the outcomes of the tests of a group, as run_tests() does
+        timings = tu.Timings(self.path)
+        for name, failed in outcomes:
+            timings.record(name, 0.1, failed)
+        timings.save()
+
+    # -------------------------------------------------------------------------
+    def test_groups_sharing_file(self):
+        # One run of several groups, each saving the shared file in turn
+        self.run_group([('c:1', True), ('c:2', False)])
+        for group in ['cpp', 'd', 'java', 'pawn', 'vala']:
+            self.run_group([('{}:1'.format(group), False)])
+
+        timings = tu.Timings(self.path)
+        self.assertTrue(timings.failed_recently('c:1'))
+        self.assertFalse(timings.failed_recently('c:2'))
+        self.assertEqual(['c:1', 'c:2'], [t.test_name for t in timings.order(
+            [Test('c:2'), Test('c:1')])])
+
+        # The durations of every group are kept
+        for group in ['cpp', 'd', 'java', 'pawn', 'vala']:
+            self.assertIsNotNone(timings.duration('{}:1'.format(group)))
+
+    # -------------------------------------------------------------------------
+    def test_failure_ages(self):
+        self.run_group([('c:1', True)])
+        for _ in range(RECENT_RUNS - 1):
+            self.run_group([('c:1', False)])
+            self.assertTrue(tu.Timings(self.path).failed_recently('c:1'))
+
+        self.run_group([('c:1', False)])
+        self.assertFalse(tu.Timings(self.path).failed_recently('c:1'))
+
+
+# =============================================================================
+class CoverageTest(unittest.TestCase):
+    f = ['int f()', '{', '   return(1);', '}']
+    g = ['int g()', '{', '   return(2);', '}']
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='uncrustify-harness-')
+        os.mkdir(os.path.join(self.dir, 'src'))
+        self.git('init', '-q')
+        self.git('config', 'user.name', 'test')
+        self.git('config', 'user.email', 'test@example.com')
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    # -------------------------------------------------------------------------
+    def git(self, *args):
+        return subprocess.check_output(
+            [tu.config.git_exe, '-C', self.dir] + list(args)).decode('utf-8')
+
+    # -------------------------------------------------------------------------
+    def write_source(self, lines):
+        with open(os.path.join(self.dir, 'src', 'a.cpp'), 'wt') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    # -------------------------------------------------------------------------
+    def commit(self, lines):
+        self.write_source(lines)
+        self.git('add', 'src/a.cpp')
+        self.git('commit', '-q', '-m', 'update')
+        return self.git('rev-parse', 'HEAD').strip()
+
+    # -------------------------------------------------------------------------
+    def build_index(self, always=()):
+        # f (lines 1-4) is executed by the first test, g (lines 6-9) by the
+        # second
+        built = self.commit(self.f + [''] + self.g)
+        index = tu.build_coverage_index(['c:1', 'c:2', 'c:3'], {
+            ('src/a.cpp', 'f()'): (1, 4, 1),
+            ('src/a.cpp', 'g()'): (6, 9, 2),
+        }, self.dir, always)
+        return index, built
+
+    # -------------------------------------------------------------------------
+    def test_indexed_version(self):
+        index, built = self.build_index()
+        self.assertEqual(built, index['commit'])
+
+        # Change g
+        self.write_source(self.f + [''] + self.g[:2] + ['   return(3);', '}'])
+        covered, stale = tu.covered_tests_since(index, built, ['src/a.cpp'],
+                                                self.dir)
+        self.assertEqual([], stale)
+        self.assertEqual({'c:2'}, covered)
+
+    # -------------------------------------------------------------------------
+    def test_always_run(self):
+        # The third test did not pass when the index was built, so it has no
+        # reliable coverage
+        index, built = self.build_index(always=['c:3'])
+
+        # Change g
+        self.write_source(self.f + [''] + self.g[:2] + ['   return(3);', '}'])
+        covered, stale = tu.covered_tests_since(index, built, ['src/a.cpp'],
+                                                self.dir)
+        self.assertEqual({'c:2', 'c:3'}, covered)
+
+    # -------------------------------------------------------------------------
+    def test_moved_function(self):
+        index, built = self.build_index()
+
+        # Move g before f, then change g: its changed line is within the
+        # lines of f in the index
+        rev = self.commit(self.g + [''] + self.f)
+        self.write_source(self.g[:2] + ['   return(3);', '}'] + [''] + self.f)
+        self.assertEqual({'c:1'}, tu.covered_tests(
+            index, tu.changed_lines(rev, ['src/a.cpp'], self.dir)))
+
+        covered, stale = tu.covered_tests_since(index, rev, ['src/a.cpp'],
+                                                self.dir)
+        self.assertEqual(['src/a.cpp'], stale)
+        self.assertIsNone(covered)
+
+
+# %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+if __name__ == '__main__':
+    unittest.main()
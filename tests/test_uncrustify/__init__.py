@@ -8,12 +8,27 @@ from .ansicolor import printc
 from .config import config, test_dir, all_tests
 
 from .failure import (Failure, ExecutionFailure, MissingFailure,
-                      MismatchFailure, UnstableFailure)
+                      MismatchFailure, TimeoutFailure, UnstableFailure)
+
+from .compare import compare_test, ratio_interval
+
+from .coverage import (build_coverage_index, write_coverage_index,
+                       read_coverage_index, changed_lines, covered_tests,
+                       stale_sources, covered_tests_since)
+
+from .impact import build_file_index, changed_files, affected_tests
+
+from .junit import write_junit
 
 from .selector import Selector
 
+from .shard import parse_shard, shard_tests, write_results, read_results
+
 from .test import SourceTest, FormatTest
 
+from .timings import Timings
+
 from .utilities import (add_test_arguments, add_format_tests_arguments,
                         add_source_tests_arguments, parse_args, run_tests,
-                        read_format_tests, report, fixup_ctest_path)
+                        count_outcomes, read_format_tests, report,
+                        fixup_ctest_path)
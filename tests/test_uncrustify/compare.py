@@ -0,0 +1,115 @@
+# Comparison of two uncrustify executables over the format tests.
+#
+# Both executables format the input of each test with its config, a given
+# number of times. Their runs are interleaved, alternating which goes first,
+# so that a change in the load of the machine affects both alike. Their
+# outputs are compared with each other and with the expected output, and the
+# durations of each pair of runs give the ratio of the time the candidate
+# takes to that of the baseline.
+#
+
+import math
+import subprocess
+import time
+
+# Two-sided 95% quantiles of Student's t distribution, by degrees of freedom
+_t95 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]
+
+
+# -----------------------------------------------------------------------------
+def _t_quantile(df):
+    return _t95[df - 1] if df <= len(_t95) else 1.960
+
+
+# -----------------------------------------------------------------------------
+def ratio_interval(log_ratios):
+    """
+    Return the geometric mean of the ratios whose logarithms are given, with
+    the bounds of its 95% confidence interval, as the tuple (ratio, low,
+    high). The bounds are None with fewer than two ratios.
+    """
+    n = len(log_ratios)
+    mean = sum(log_ratios) / n
+    if n < 2:
+        return math.exp(mean), None, None
+
+    variance = sum((x - mean) ** 2 for x in log_ratios) / (n - 1)
+    half_width = _t_quantile(n - 1) * math.sqrt(variance / n)
+    return (math.exp(mean), math.exp(mean - half_width),
+            math.exp(mean + half_width))
+
+
+# -----------------------------------------------------------------------------
+def _time_run(cmd, timeout):
+    # Returns the exit code (None on timeout), the output and the duration
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    try:
+        output, _ = proc.communicate(timeout=timeout or None)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.communicate()
+        return None, None, time.perf_counter() - start
+    return proc.returncode, output, time.perf_counter() - start
+
+
+# -----------------------------------------------------------------------------
+def compare_test(test, baseline, candidate, repeat, timeout=None):
+    """
+    Run the first pass of the format test with both executables, repeat
+    times each, and return a record of the outcome: for each executable, its
+    'returncode' (None if it timed out), whether its output 'matches' the
+    expected output and its 'times'; whether a run hit the 'timeout', in
+    which case the test is not repeated; whether both produced the 'same'
+    output; and the 'ratio' of the times of the candidate to those of the
+    baseline, as returned by ratio_interval() (None after a timeout).
+    """
+    p = test.test_passes[0]
+    args = ['-q', '-l', p.test_lang, '-c', p.test_config, '-f', p.test_input]
+
+    try:
+        with open(p.test_expected, 'rb') as f:
+            expected = f.read()
+    except (IOError, OSError):
+        expected = None
+
+    record = {'name': test.test_name}
+    outputs = {}
+    runs = [('baseline', baseline), ('candidate', candidate)]
+    for key, _ in runs:
+        record[key] = {'returncode': None, 'matches': False, 'times': []}
+
+    timed_out = False
+    for i in range(repeat):
+        for key, exe in (runs if i % 2 == 0 else runs[::-1]):
+            returncode, output, duration = _time_run([exe] + args, timeout)
+            record[key]['times'].append(duration)
+            if i == 0:
+                record[key]['returncode'] = returncode
+                record[key]['matches'] = (returncode == 0 and
+                                          output == expected)
+                outputs[key] = output
+            if returncode is None:
+                # Do not wait for the timeout again
+                timed_out = True
+                break
+        if timed_out:
+            break
+
+    record['timeout'] = timed_out
+    record['same'] = (
+        not timed_out and
+        record['baseline']['returncode'] == record['candidate']['returncode']
+        and outputs['baseline'] == outputs['candidate'])
+
+    if timed_out:
+        record['ratio'] = None
+    else:
+        pairs = zip(record['baseline']['times'], record['candidate']['times'])
+        record['ratio'] = ratio_interval([math.log(c / b) for b, c in pairs])
+    return record
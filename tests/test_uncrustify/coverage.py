@@ -0,0 +1,319 @@
+# Selection of the tests affected by a change, by code coverage.
+#
+# The index is built offline, by running every test once against a build of
+# uncrustify instrumented for gcov. Each test writes its coverage data to a
+# directory of its own (through GCOV_PREFIX), from which gcov extracts the
+# functions of src/*.cpp it executed. For every function, the index keeps its
+# line range and a bitmap of the tests that executed it.
+#
+# The tests affected by a change to src/*.cpp are then the ones that executed
+# a function whose lines changed. The line ranges are only valid for the
+# versions of the sources the index was built from, so the index records the
+# git blob of each of them; a change from any other version of a source might
+# affect any test.
+#
+# A test that did not pass, or left no coverage data (when killed on timeout,
+# say), might execute any function, so the index lists it among the tests
+# that every change affects.
+#
+
+import base64
+import gzip
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from multiprocessing.pool import ThreadPool
+
+from .config import config, test_dir
+from .utilities import _ThreadOutput, _run_test, count_outcomes
+
+root_dir = os.path.dirname(test_dir)
+
+# Bump when the layout of the index changes
+_version = 3
+
+_re_hunk = re.compile(r'^@@ -(\d+)(?:,(\d+))? ')
+
+
+# -----------------------------------------------------------------------------
+def _encode_bitmap(bits, size):
+    data = bits.to_bytes((size + 7) // 8, 'little')
+    return base64.b64encode(data).decode('ascii')
+
+
+# -----------------------------------------------------------------------------
+def _decode_bitmap(text):
+    return int.from_bytes(base64.b64decode(text), 'little')
+
+
+# -----------------------------------------------------------------------------
+def _source_path(path, cwd):
+    # Path of a source file named by gcov relative to the root, if it is one
+    # of src/*.cpp
+    path = os.path.relpath(os.path.normpath(os.path.join(cwd, path)),
+                           root_dir).replace(os.sep, '/')
+    if re.match(r'^src/[^/]+\.cpp$', path):
+        return path
+    return None
+
+
+# -----------------------------------------------------------------------------
+def _function_coverage(prefix_dir, gcov_exe):
+    # Link the notes file of each data file written under the prefix next to
+    # it, where gcov expects it, and have gcov report the line range of every
+    # function and whether it was executed
+    data_files = []
+    for dirpath, _, filenames in os.walk(prefix_dir):
+        for name in filenames:
+            if name.endswith('.gcda'):
+                gcda = os.path.join(dirpath, name)
+                gcno = gcda[len(prefix_dir):-len('.gcda')] + '.gcno'
+                if os.path.exists(gcno):
+                    os.symlink(gcno, gcda[:-len('.gcda')] + '.gcno')
+                    data_files.append(gcda)
+
+    if not data_files:
+        return {}
+
+    proc = subprocess.Popen([gcov_exe, '--stdout', '--json-format'] +
+                            data_files, cwd=prefix_dir,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output, errors = proc.communicate()
+    if proc.returncode != 0:
+        # Such as notes and data files of different gcov versions; the index
+        # would silently miss what the test executed
+        raise RuntimeError('{} failed with exit code {}:\n{}'.format(
+            gcov_exe, proc.returncode, errors.decode('utf-8', 'replace')))
+
+    functions = {}
+    for line in output.decode('utf-8').splitlines():
+        if not line.startswith('{'):
+            continue
+        report = json.loads(line)
+        cwd = report.get('current_working_directory', '')
+        for f in report['files']:
+            path = _source_path(f['file'], cwd)
+            if path is None:
+                continue
+            for fn in f['functions']:
+                functions[(path, fn['demangled_name'])] = (
+                    fn['start_line'], fn['end_line'],
+                    fn['execution_count'] > 0)
+    return functions
+
+
+# -----------------------------------------------------------------------------
+def _git(root, *args):
+    return subprocess.check_output(
+        (config.git_exe, '-C', root) + args).decode('utf-8')
+
+
+# -----------------------------------------------------------------------------
+def build_coverage_index(test_names, functions, root=root_dir, always=()):
+    """
+    Return the coverage index of the functions, a dict from (source, name)
+    to the tuple (first line, last line, bitmap of the tests, by their index
+    in test_names, that executed it), where the sources are the current
+    versions of src/*.cpp files relative to root. The tests named in always
+    are affected by any change.
+    """
+    index = {
+        'version': _version,
+        'commit': _git(root, 'rev-parse', 'HEAD').strip(),
+        'tests': list(test_names),
+        'always': sorted(always),
+        'files': {},
+        'blobs': {},
+    }
+    for (source, name), (start, end, bits) in sorted(functions.items()):
+        index['files'].setdefault(source, []).append({
+            'name': name,
+            'start': start,
+            'end': end,
+            'tests': _encode_bitmap(bits, len(test_names)),
+        })
+
+    sources = sorted(index['files'])
+    if sources:
+        blobs = _git(root, 'hash-object', '--', *sources).split()
+        index['blobs'] = dict(zip(sources, blobs))
+    return index
+
+
+# -----------------------------------------------------------------------------
+def write_coverage_index(path, tests, args):
+    """
+    Run the tests against the gcov instrumented executable and write the
+    index of the functions each of them executed to path. Returns the number
+    of tests per outcome, as run_tests() does.
+    """
+    work_dir = tempfile.mkdtemp(prefix='uncrustify-coverage-')
+
+    def run(i):
+        test = tests[i]
+        prefix_dir = os.path.join(work_dir, str(i))
+        os.mkdir(prefix_dir)
+        env = dict(os.environ)
+        env['GCOV_PREFIX'] = prefix_dir
+        env['GCOV_PREFIX_STRIP'] = '0'
+        test.test_env = env
+        try:
+            result = _run_test(test, args, output)
+            return i, result, _function_coverage(prefix_dir, args.gcov)
+        finally:
+            shutil.rmtree(prefix_dir, ignore_errors=True)
+
+    functions = {}
+    records = []
+    always = []
+    output = _ThreadOutput(sys.stdout)
+    sys.stdout = output
+    pool = ThreadPool(max(1, args.jobs))
+    try:
+        for i, (test, outcome, duration, text), coverage in \
+                pool.imap_unordered(run, range(len(tests))):
+            if text:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+            records.append({'outcome': outcome})
+            if outcome != 'passing' or not coverage:
+                always.append(test.test_name)
+
+            for key, (start, end, executed) in coverage.items():
+                entry = functions.setdefault(key, [start, end, 0])
+                if executed:
+                    entry[2] |= 1 << i
+    finally:
+        pool.close()
+        pool.join()
+        sys.stdout = output.stream
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    index = build_coverage_index([t.test_name for t in tests], functions,
+                                 always=always)
+
+    with gzip.open(path, 'wt') as f:
+        json.dump(index, f, sort_keys=True)
+
+    print('Coverage index of {} functions in {} files written to {}'.format(
+        len(functions), len(index['files']), path))
+    if always:
+        print('{} tests did not pass or left no coverage data, and run for '
+              'any change'.format(len(always)))
+    return count_outcomes(records)
+
+
+# -----------------------------------------------------------------------------
+def read_coverage_index(path):
+    with gzip.open(path, 'rt') as f:
+        index = json.load(f)
+    if index.get('version') != _version:
+        raise ValueError('{}: unsupported coverage index version'.format(path))
+    return index
+
+
+# -----------------------------------------------------------------------------
+def changed_lines(rev, paths, root=root_dir):
+    """
+    Return, for each of the paths (relative to root), the ranges of the lines
+    of its version in rev that differ from the working tree, as a list of
+    (first, last) tuples.
+    """
+    diff = subprocess.check_output(
+        [config.git_exe, '-C', root, 'diff', '-U0', '--no-renames', rev,
+         '--'] + paths)
+
+    ranges = {}
+    current = None
+    in_header = False
+    for line in diff.decode('utf-8', 'replace').splitlines():
+        if line.startswith('diff --git '):
+            current = None
+            in_header = True
+        elif in_header and line.startswith('--- '):
+            if line.startswith('--- a/'):
+                current = line[6:]
+                ranges[current] = []
+        elif in_header and line.startswith('+++ '):
+            in_header = False
+            if current is None and line.startswith('+++ b/'):
+                # A new file, which no test could have executed yet
+                ranges[line[6:]] = None
+        elif current is not None:
+            m = _re_hunk.match(line)
+            if m:
+                first = int(m.group(1))
+                count = 1 if m.group(2) is None else int(m.group(2))
+                # A pure insertion follows line 'first'; it touches that line
+                # and the next
+                last = first + count - 1 if count else first + 1
+                ranges[current].append((first, last))
+
+    # Changed paths missing from the diff are untracked, thus new, files
+    for path in paths:
+        ranges.setdefault(path, None)
+    return ranges
+
+
+# -----------------------------------------------------------------------------
+def covered_tests(index, ranges):
+    """
+    Return the names of the tests that executed a function in one of the
+    changed line ranges (as returned by changed_lines()), along with those
+    the index runs for any change, or None if some change is not within a
+    function known to the index, which might affect any test.
+    """
+    bits = 0
+    for path, path_ranges in ranges.items():
+        if path_ranges is None or not path.endswith('.cpp'):
+            return None
+
+        functions = index['files'].get(path)
+        if functions is None:
+            # A file that was not part of the instrumented build
+            return None
+
+        for first, last in path_ranges:
+            hit = [fn for fn in functions
+                   if fn['start'] <= last and first <= fn['end']]
+            if not hit:
+                return None
+            for fn in hit:
+                bits |= _decode_bitmap(fn['tests'])
+
+    return set(name for i, name in enumerate(index['tests'])
+               if bits >> i & 1) | set(index['always'])
+
+
+# -----------------------------------------------------------------------------
+def stale_sources(index, rev, paths, root=root_dir):
+    """
+    Return those of the paths (relative to root) whose version in rev is not
+    the one the index was built from, so that their line numbers might not
+    match those of the index.
+    """
+    at_rev = {}
+    for line in _git(root, 'ls-tree', rev, '--', *paths).splitlines():
+        info, _, path = line.partition('\t')
+        at_rev[path] = info.split()[2]
+
+    return [p for p in paths if at_rev.get(p) != index['blobs'].get(p)]
+
+
+# -----------------------------------------------------------------------------
+def covered_tests_since(index, rev, paths, root=root_dir):
+    """
+    Return the names of the tests that executed a function of the paths
+    (src/*.cpp files relative to root) that changed since rev, or None if any
+    test might be affected, along with the paths that are stale in the index
+    (as returned by stale_sources()), which affect every test.
+    """
+    stale = stale_sources(index, rev, paths, root)
+    if stale:
+        return None, stale
+    return covered_tests(index, changed_lines(rev, paths, root)), []
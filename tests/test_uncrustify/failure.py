@@ -32,6 +32,20 @@ class ExecutionFailure(Failure):
         return str(self.exception)
 
 
+# =============================================================================
+class TimeoutFailure(Failure):
+    # -------------------------------------------------------------------------
+    def __init__(self, command, timeout, elapsed):
+        self.command = command
+        self.timeout = timeout
+        self.elapsed = elapsed
+
+    # -------------------------------------------------------------------------
+    def __str__(self):
+        return 'Command {!r} killed after {:.1f}s (timeout {:g}s)'.format(
+            self.command, self.elapsed, self.timeout)
+
+
 # =============================================================================
 class MissingFailure(Failure):
     # -------------------------------------------------------------------------
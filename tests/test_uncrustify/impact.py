@@ -0,0 +1,89 @@
+# Selection of the tests affected by a change.
+#
+# Every format test references its config, input and expected files; an
+# index from each of those files (and the .test file declaring the test) to
+# the tests using it tells which tests a set of changed files affects. A
+# change to anything the uncrustify binary or the test harness is built from
+# affects every test.
+#
+
+import os
+import subprocess
+
+from .config import config, test_dir
+
+root_dir = os.path.dirname(test_dir)
+
+# Paths, relative to the root of the repository, of the files and directories
+# that affect every test
+ALL_TESTS_PATHS = [
+    'CMakeLists.txt',
+    'cmake/',
+    'scripts/',
+    'src/',
+    'tests/run_format_tests.py',
+    'tests/test_uncrustify/',
+]
+
+_test_files = [
+    'test_input',
+    'test_config',
+    'test_expected',
+    'test_rerun_config',
+    'test_rerun_expected',
+]
+
+
+# -----------------------------------------------------------------------------
+def build_file_index(tests):
+    """
+    Return a dict from the absolute path of every file used by the tests to
+    the set of the names of the tests using it.
+    """
+    index = {}
+
+    def add(path, name):
+        index.setdefault(os.path.normpath(path), set()).add(name)
+
+    for test in tests:
+        for attr in _test_files:
+            add(getattr(test, attr), test.test_name)
+
+        group = test.test_name.split(':')[0]
+        add(os.path.join(test_dir, '{}.test'.format(group)), test.test_name)
+
+    return index
+
+
+# -----------------------------------------------------------------------------
+def changed_files(rev):
+    """
+    Return the paths, relative to the root of the repository, of the files
+    that differ between rev and the working tree, including untracked files.
+    """
+    git = [config.git_exe, '-C', root_dir]
+    changed = subprocess.check_output(
+        git + ['diff', '--name-only', '--no-renames', rev, '--'])
+    untracked = subprocess.check_output(
+        git + ['ls-files', '--others', '--exclude-standard'])
+
+    paths = (changed + untracked).decode('utf-8').splitlines()
+    return sorted(set(p for p in paths if p))
+
+
+# -----------------------------------------------------------------------------
+def affected_tests(index, paths):
+    """
+    Return the names of the tests affected by the changed paths (relative to
+    the root of the repository), or None if every test is affected.
+    """
+    names = set()
+    for path in paths:
+        if any(path == p or (p.endswith('/') and path.startswith(p))
+               for p in ALL_TESTS_PATHS):
+            return None
+
+        names.update(index.get(
+            os.path.normpath(os.path.join(root_dir, path)), ()))
+
+    return names
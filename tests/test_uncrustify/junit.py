@@ -0,0 +1,60 @@
+# Writing test results as a JUnit XML report.
+#
+# A CTest test runs a whole group (or a shard of one) of format tests, so
+# CTest only knows whether all of them passed. The report gives the outcome,
+# duration and output of each format test to the tools reading JUnit XML,
+# such as most CI servers.
+#
+
+import re
+import xml.etree.ElementTree as ET
+
+# Outcomes reported as a failure (the output is wrong) or as an error (the
+# test could not be run to completion); other outcomes pass
+_failures = ['mismatch', 'unstable', 'xpass']
+_errors = ['failing', 'timeout']
+
+# Terminal color sequences, and other characters that XML does not allow
+_re_unprintable = re.compile(r'\x1b\[[0-9;]*[A-Za-z]|'
+                             r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+# -----------------------------------------------------------------------------
+def _attrs(records):
+    return {
+        'tests': str(len(records)),
+        'failures': str(sum(r['outcome'] in _failures for r in records)),
+        'errors': str(sum(r['outcome'] in _errors for r in records)),
+        'time': '{:.3f}'.format(sum(r['duration'] for r in records)),
+    }
+
+
+# -----------------------------------------------------------------------------
+def write_junit(path, records, name='uncrustify'):
+    """
+    Write the records of a run, as appended to the results list of
+    run_tests(), to path as a JUnit XML report with a test suite per group.
+    """
+    groups = {}
+    for record in records:
+        groups.setdefault(record['name'].split(':')[0], []).append(record)
+
+    root = ET.Element('testsuites', name=name, **_attrs(records))
+    for group in sorted(groups):
+        group_records = sorted(groups[group], key=lambda r: r['name'])
+        suite = ET.SubElement(root, 'testsuite', name=group,
+                              skipped='0', **_attrs(group_records))
+        for record in group_records:
+            case = ET.SubElement(suite, 'testcase', classname=group,
+                                 name=record['name'],
+                                 time='{:.3f}'.format(record['duration']))
+            outcome = record['outcome']
+            if outcome in _failures or outcome in _errors:
+                kind = 'failure' if outcome in _failures else 'error'
+                element = ET.SubElement(case, kind, type=outcome,
+                                        message='{}: {}'.format(
+                                            outcome.upper(), record['name']))
+                element.text = _re_unprintable.sub(
+                    '', record.get('output', ''))
+
+    ET.ElementTree(root).write(path, encoding='utf-8', xml_declaration=True)
@@ -0,0 +1,102 @@
+# Splitting the tests into shards, run separately (for example on several CI
+# nodes), and merging the results of the shards.
+#
+# The partition only depends on the test names and, if given, the timings
+# file, so every node computes the same one without any coordination.
+#
+
+import json
+import zlib
+
+
+# -----------------------------------------------------------------------------
+def parse_shard(s):
+    """
+    Parse a shard specification 'I/N' (the I-th of N shards, counting from 1)
+    into the tuple (I, N); raises ValueError if it is malformed.
+    """
+    index, _, count = s.partition('/')
+    index, count = int(index), int(count)
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError('invalid shard {!r}'.format(s))
+    return index, count
+
+
+# -----------------------------------------------------------------------------
+def shard_tests(tests, index, count, timings=None):
+    """
+    Return the tests of the shard index (counting from 1) of count.
+
+    With timings that know some of the tests, the shards are balanced by
+    duration: the tests are assigned, longest first, to the shard with the
+    least work so far. Otherwise the tests are assigned by a hash of their
+    name. Either way the tests keep their order within the shard.
+    """
+    if timings is not None and timings.tests:
+        loads = [0.0] * count
+        shard_of = {}
+        for test in sorted(tests, key=lambda t: (-timings.estimate(t.test_name),
+                                                 t.test_name)):
+            shard = loads.index(min(loads))
+            loads[shard] += timings.estimate(test.test_name)
+            shard_of[test.test_name] = shard
+        return [t for t in tests if shard_of[t.test_name] == index - 1]
+
+    return [t for t in tests
+            if zlib.crc32(t.test_name.encode('utf-8')) % count == index - 1]
+
+
+# -----------------------------------------------------------------------------
+def write_results(path, shard, records):
+    """
+    Write the results of a shard: its specification ('I/N' or None) and a
+    record for each test, as returned in the results list of run_tests().
+    """
+    with open(path, 'wt') as f:
+        json.dump({'shard': shard, 'tests': records}, f, indent=1)
+
+
+# -----------------------------------------------------------------------------
+def read_results(paths):
+    """
+    Read and combine the result files of several shards.
+
+    Returns the combined test records and a list of problems found: missing
+    or repeated shards and tests reported by more than one shard.
+    """
+    records = []
+    problems = []
+    seen_shards = set()
+    seen_tests = set()
+    count = None
+
+    for path in paths:
+        with open(path, 'rt') as f:
+            data = json.load(f)
+
+        if data['shard'] is not None:
+            index, shard_count = parse_shard(data['shard'])
+            if count is not None and shard_count != count:
+                problems.append('{}: shard {} does not belong to a split '
+                                'into {} shards'.format(path, data['shard'],
+                                                        count))
+            count = shard_count
+            if index in seen_shards:
+                problems.append('{}: shard {} given more than once'.format(
+                    path, data['shard']))
+            seen_shards.add(index)
+
+        for record in data['tests']:
+            if record['name'] in seen_tests:
+                problems.append('{}: test {} reported more than once'.format(
+                    path, record['name']))
+            seen_tests.add(record['name'])
+            records.append(record)
+
+    if count is not None:
+        missing = sorted(set(range(1, count + 1)) - seen_shards)
+        if missing:
+            problems.append('missing results of shard(s) {}'.format(
+                ', '.join('{}/{}'.format(i, count) for i in missing)))
+
+    return records, problems
@@ -5,19 +5,55 @@
 # * @author  Matthew Woehlke    June 2018
 #
 
-import filecmp
 import os
 import re
+import signal
 import subprocess
 import sys
 import errno
+import time
 
 from .ansicolor import printc
 from .config import (config, test_dir, FAIL_ATTRS, PASS_ATTRS,
                      MISMATCH_ATTRS, UNSTABLE_ATTRS)
 from .failure import (ExecutionFailure, MismatchFailure, MissingFailure,
-                      TestDeclarationParseError, UnexpectedlyPassingFailure,
-                      UnstableFailure)
+                      TestDeclarationParseError, TimeoutFailure,
+                      UnexpectedlyPassingFailure, UnstableFailure)
+
+
+# -----------------------------------------------------------------------------
+def _start_process_group(cmd, **kwargs):
+    # Starts cmd in a process group of its own, so that it can be killed
+    # along with anything it started by _kill_process_group()
+    if os.name == 'nt':
+        kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs['start_new_session'] = True
+    return subprocess.Popen(cmd, **kwargs)
+
+
+# -----------------------------------------------------------------------------
+def _kill_process_group(proc):
+    if os.name == 'nt':
+        with open(os.devnull, 'w') as bitbucket:
+            subprocess.call(['taskkill', '/F', '/T', '/PID', str(proc.pid)],
+                            stdout=bitbucket, stderr=bitbucket)
+    else:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+    proc.kill()
+
+
+# -----------------------------------------------------------------------------
+def _make_dirs(path):
+    if not os.path.exists(path):
+        try:
+            os.makedirs(path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
 
 
 # =============================================================================
@@ -25,6 +61,7 @@ class SourceTest(object):
     # -------------------------------------------------------------------------
     def __init__(self):
         self.test_result_dir = 'results'
+        self.test_env = None
 
         self.diff_text = 'MISMATCH'
         self.diff_attrs = MISMATCH_ATTRS
@@ -46,7 +83,14 @@ class SourceTest(object):
     def _diff(self, expected, actual):
         sys.stdout.flush()
         cmd = [config.git_exe, 'diff', '--no-index', expected, actual]
-        subprocess.call(cmd)
+        if getattr(sys.stdout, 'capturing', False):
+            # The output of a test running concurrently is being collected
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT)
+            output, _ = proc.communicate()
+            sys.stdout.write(output.decode('utf-8', 'replace'))
+        else:
+            subprocess.call(cmd)
 
     # -------------------------------------------------------------------------
     def build(self, test_input, test_lang, test_config, test_expected):
@@ -67,86 +111,179 @@ class SourceTest(object):
         self._check_attr('test_xfail')
 
     # -------------------------------------------------------------------------
-    def run(self, args):
+    def _command(self, output_path=None, debug_path=None, from_stdin=False):
+        # Without an output path, the result is written to stdout
+        cmd = [
+            config.uncrustify_exe,
+            '-q',
+            '-l', self.test_lang,
+            '-c', self.test_config,
+        ]
+        if not from_stdin:
+            cmd += ['-f', self.test_input]
+        if output_path is not None:
+            cmd += ['-o', output_path]
+        if debug_path is not None:
+            cmd += [
+                '-LA',
+                '-p', debug_path + '.unc'
+            ]
+
+        return cmd
+
+    # -------------------------------------------------------------------------
+    def _execute(self, cmd, args, input_data=None, stderr=subprocess.STDOUT):
+        # Each pass runs in a process group of its own, so that a pass that
+        # exceeds the timeout can be killed along with anything it started.
+        # As with Popen.communicate(), the returned errors are None unless
+        # stderr is a pipe
+        start = time.time()
+        proc = _start_process_group(
+            cmd, stdout=subprocess.PIPE, stderr=stderr,
+            stdin=subprocess.PIPE if input_data is not None else None,
+            env=self.test_env)
+        try:
+            output, errors = proc.communicate(input_data,
+                                              timeout=args.timeout or None)
+        except subprocess.TimeoutExpired:
+            _kill_process_group(proc)
+            proc.communicate()
+            elapsed = time.time() - start
+            msg = '{} (killed after {:.1f}s)'.format(self.test_name, elapsed)
+            printc('TIMEOUT: ', msg, **FAIL_ATTRS)
+            raise TimeoutFailure(cmd, args.timeout, elapsed)
+
+        return proc.returncode, output, errors
+
+    # -------------------------------------------------------------------------
+    def _collect_diagnostics(self, args, _result):
+        # Normal runs do not log; re-run the failed pass with all logging and
+        # the parse dump enabled, keeping the result of the failed run. A pass
+        # fed through stdin got the content of its input file, so the re-run
+        # can read that file instead
+        _make_dirs(os.path.dirname(_result))
+        cmd = self._command(os.devnull, _result)
+        if args.show_commands:
+            printc('RUN: ', repr(cmd))
+
+        try:
+            _, output, _ = self._execute(cmd, args)
+        except TimeoutFailure:
+            return
+        with open(_result + '.log', 'wb') as f:
+            f.write(output)
+
+        print('  Diagnostics: {0}.log, {0}.unc'.format(_result))
+
+    # -------------------------------------------------------------------------
+    def _result_path(self, args):
+        return os.path.join(args.result_dir, self.test_result_dir,
+                            os.path.basename(os.path.dirname(
+                                self.test_expected)),
+                            os.path.basename(self.test_expected))
+
+    # -------------------------------------------------------------------------
+    def run(self, args, input_data=None):
+        """
+        Run the test. If input_data is given, it is fed to uncrustify through
+        stdin in place of the input file. Returns the result if it matches
+        the expected output, or None.
+        """
+        start = time.time()
+        try:
+            return self._run(args, input_data)
+        except (ExecutionFailure, self.diff_exception):
+            if not args.debug:
+                self._collect_diagnostics(args, self._result_path(args))
+            raise
+        finally:
+            self.pass_durations = [time.time() - start]
+
+    # -------------------------------------------------------------------------
+    def _run(self, args, input_data=None):
         self._check()
 
         _expected = self.test_expected
-        _result = os.path.join(args.result_dir, self.test_result_dir,
-                               os.path.basename(os.path.dirname(_expected)),
-                               os.path.basename(_expected))
+        _result = self._result_path(args)
 
         if args.verbose:
             print(self.test_name)
             print('  Language : {}'.format(self.test_lang))
-            print('     Input : {}'.format(self.test_input))
+            print('     Input : {}'.format(
+                'stdin' if input_data is not None else self.test_input))
             print('    Config : {}'.format(self.test_config))
             print('  Expected : {}'.format(_expected))
             print('    Result : {}'.format(_result))
             print('     XFail : {}'.format(self.test_xfail))
 
-        if not os.path.exists(os.path.dirname(_result)):
-            try:
-                os.makedirs(os.path.dirname(_result))
-            except OSError as e:
-                if e.errno != errno.EEXIST:
-                    raise
-
-        cmd = [
-            config.uncrustify_exe,
-            '-q',
-            '-l', self.test_lang,
-            '-c', self.test_config,
-            '-f', self.test_input,
-            '-o', _result
-        ]
         if args.debug:
-            cmd += [
-                '-LA',
-                '-p', _result + '.unc'
-            ]
-
+            # Keep every artifact of the run
+            _make_dirs(os.path.dirname(_result))
+            cmd = self._command(_result, _result)
+            input_data = None
         else:
-            cmd += ['-LA']
+            # The result is compared in memory, and only written to the
+            # result file if it differs from the expected output
+            cmd = self._command(from_stdin=(input_data is not None))
 
         if args.show_commands:
             printc('RUN: ', repr(cmd))
 
+        result, errors = b'', b''
         try:
-            output = subprocess.check_output(cmd, stderr=subprocess.STDOUT)
-        except subprocess.CalledProcessError as exc:
-            output = exc.output
-            if not self.test_xfail:
-                print(output.rstrip())
-                msg = '{} (Uncrustify error code {})'
-                msg = msg.format(self.test_name, exc.returncode)
-                printc('FAILED: ', msg, **FAIL_ATTRS)
-                raise ExecutionFailure(exc)
-            elif args.xdiff:
-                print(output.rstrip())
+            returncode, result, errors = self._execute(
+                cmd, args, input_data, stderr=subprocess.PIPE)
+            if returncode != 0:
+                if not self.test_xfail:
+                    print(errors.decode('utf-8', 'replace').rstrip())
+                    msg = '{} (Uncrustify error code {})'
+                    msg = msg.format(self.test_name, returncode)
+                    printc('FAILED: ', msg, **FAIL_ATTRS)
+                    raise ExecutionFailure(subprocess.CalledProcessError(
+                        returncode, cmd, errors))
+                elif args.xdiff:
+                    print(errors.decode('utf-8', 'replace').rstrip())
         finally:
             if args.debug:
-                with open(_result + '.log', 'wt') as f:
-                    f.write(output)
+                with open(_result + '.log', 'wb') as f:
+                    f.write(errors)
 
         try:
-            has_diff = not filecmp.cmp(_expected, _result)
-            if has_diff and not self.test_xfail:
-                if args.diff:
-                    self._diff(_expected, _result)
-                printc('{}: '.format(self.diff_text),
-                       self.test_name, **self.diff_attrs)
-                raise self.diff_exception(_expected, _result)
-            if not has_diff and self.test_xfail:
-                raise UnexpectedlyPassingFailure(_expected, _result)
-            if has_diff and self.test_xfail:
-                if args.xdiff:
-                    self._diff(_expected, _result)
-                    if not args.show_all:
-                        printc('XFAILED: ', self.test_name, **PASS_ATTRS)
-        except OSError as exc:
+            with open(_expected, 'rb') as f:
+                expected = f.read()
+            if args.debug:
+                with open(_result, 'rb') as f:
+                    result = f.read()
+        except (IOError, OSError) as exc:
             printc('MISSING: ', self.test_name, **self.diff_attrs)
             raise MissingFailure(exc, _expected)
 
+        has_diff = result != expected
+        if not args.debug:
+            if has_diff:
+                _make_dirs(os.path.dirname(_result))
+                with open(_result, 'wb') as f:
+                    f.write(result)
+            elif os.path.exists(_result):
+                # Left over from a previous run that failed
+                os.remove(_result)
+
+        if has_diff and not self.test_xfail:
+            if args.diff:
+                self._diff(_expected, _result)
+            printc('{}: '.format(self.diff_text),
+                   self.test_name, **self.diff_attrs)
+            raise self.diff_exception(_expected, _result)
+        if not has_diff and self.test_xfail:
+            raise UnexpectedlyPassingFailure(_expected, _result)
+        if has_diff and self.test_xfail:
+            if args.xdiff:
+                self._diff(_expected, _result)
+                if not args.show_all:
+                    printc('XFAILED: ', self.test_name, **PASS_ATTRS)
+
+        return None if has_diff else result
+
 
 # =============================================================================
 class FormatTest(SourceTest):
@@ -288,5 +425,16 @@ class FormatTest(SourceTest):
 
     # -------------------------------------------------------------------------
     def run(self, args):
+        # When the first pass produces the expected output, that output is
+        # the input of the re-run pass, which gets it through stdin rather
+        # than reading the expected file again. Windows reads stdin in text
+        # mode, which would alter line endings, so the re-run pass reads the
+        # file there
+        self.pass_durations = []
+        result = None
         for p in self.test_passes:
-            p.run(args)
+            p.test_env = self.test_env
+            try:
+                result = p.run(args, result if os.name != 'nt' else None)
+            finally:
+                self.pass_durations += p.pass_durations
@@ -0,0 +1,145 @@
+# Durations and outcomes of previous test runs.
+#
+# The timings of each run are kept in a small JSON file, which is used to
+# schedule the next run: tests that failed recently go first, for quick
+# feedback, followed by the others from longest to shortest, so that a slow
+# test does not start last and stretch the run when tests run in parallel.
+#
+# Each test counts its own runs, so that how recent a failure is does not
+# depend on how many processes (test groups, shards) share the file.
+#
+
+import contextlib
+import json
+import os
+import tempfile
+
+# Bump when the layout of the file changes
+_version = 2
+
+# A test that failed within this many of its runs is scheduled first
+RECENT_RUNS = 3
+
+# Weight of the latest duration in the stored (moving average) duration
+_SMOOTHING = 0.5
+
+
+# -----------------------------------------------------------------------------
+@contextlib.contextmanager
+def _locked(path):
+    # Holds an exclusive lock on a file next to path, so that processes
+    # sharing the timings file update it one at a time
+    with open(path + '.lock', 'a+b') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+# =============================================================================
+class Timings(object):
+    # -------------------------------------------------------------------------
+    def __init__(self, path):
+        self.path = path
+        self.tests = {}
+        self.updates = {}
+
+        data = self._load()
+        if data is not None:
+            self.tests = data['tests']
+
+    # -------------------------------------------------------------------------
+    def _load(self):
+        try:
+            with open(self.path, 'rt') as f:
+                data = json.load(f)
+            if data.get('version') == _version:
+                return data
+        except (IOError, OSError, ValueError):
+            pass
+        return None
+
+    # -------------------------------------------------------------------------
+    def duration(self, name):
+        entry = self.tests.get(name)
+        return entry['duration'] if entry is not None else None
+
+    # -------------------------------------------------------------------------
+    def failed_recently(self, name):
+        # 'failed' is the number of runs of the test when it last failed
+        entry = self.tests.get(name)
+        return (entry is not None and entry['failed'] is not None and
+                entry['runs'] - entry['failed'] < RECENT_RUNS)
+
+    # -------------------------------------------------------------------------
+    def estimate(self, name):
+        # Tests without a known duration are assumed to take as long as the
+        # median test
+        duration = self.duration(name)
+        if duration is not None:
+            return duration
+
+        known = sorted(e['duration'] for e in self.tests.values())
+        return known[len(known) // 2] if known else 0.0
+
+    # -------------------------------------------------------------------------
+    def order(self, tests):
+        # Recent failures first, then longest processing time first; the sort
+        # is stable, so ties keep their declaration order
+        return sorted(tests, key=lambda t: (
+            not self.failed_recently(t.test_name),
+            -self.estimate(t.test_name)))
+
+    # -------------------------------------------------------------------------
+    def record(self, name, duration, failed):
+        self.updates[name] = (duration, failed)
+
+    # -------------------------------------------------------------------------
+    def save(self):
+        if not self.updates:
+            return
+
+        out_dir = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+
+        # Several test groups may run concurrently and share the file, so
+        # merge into its current content, under the lock, and replace it
+        # atomically
+        with _locked(self.path):
+            data = self._load() or {'version': _version, 'tests': {}}
+            for name, (duration, failed) in self.updates.items():
+                entry = data['tests'].get(name)
+                if entry is None:
+                    entry = {'duration': duration, 'runs': 0, 'failed': None}
+                else:
+                    entry['duration'] += _SMOOTHING * (duration -
+                                                       entry['duration'])
+                entry['runs'] += 1
+                if failed:
+                    entry['failed'] = entry['runs']
+                data['tests'][name] = entry
+
+            fd, tmp_path = tempfile.mkstemp(dir=out_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wt') as f:
+                    json.dump(data, f, sort_keys=True, indent=1)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+        self.tests = data['tests']
+        self.updates = {}
@@ -9,12 +9,60 @@ import argparse
 import os
 import subprocess
 import sys
+import threading
+import time
+
+from multiprocessing.pool import ThreadPool
 
 from .ansicolor import printc
 from .config import config, all_tests, FAIL_ATTRS, PASS_ATTRS, SKIP_ATTRS
-from .failure import (Failure, MismatchFailure, UnexpectedlyPassingFailure,
-                      UnstableFailure)
+from .failure import (Failure, MismatchFailure, TimeoutFailure,
+                      UnexpectedlyPassingFailure, UnstableFailure)
+from .shard import parse_shard
 from .test import FormatTest
+from .timings import Timings
+
+
+# =============================================================================
+class _ThreadOutput(object):
+    # Stands in for sys.stdout while tests run concurrently; whatever a test
+    # prints is collected by the thread running it, so that it can be printed
+    # in one piece once the test is done
+    # -------------------------------------------------------------------------
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    # -------------------------------------------------------------------------
+    @property
+    def capturing(self):
+        return getattr(self.local, 'buffer', None) is not None
+
+    # -------------------------------------------------------------------------
+    def start(self):
+        self.local.buffer = []
+
+    # -------------------------------------------------------------------------
+    def stop(self):
+        text = ''.join(self.local.buffer)
+        self.local.buffer = None
+        return text
+
+    # -------------------------------------------------------------------------
+    def write(self, text):
+        if self.capturing:
+            self.local.buffer.append(text)
+        else:
+            self.stream.write(text)
+
+    # -------------------------------------------------------------------------
+    def flush(self):
+        if not self.capturing:
+            self.stream.flush()
+
+    # -------------------------------------------------------------------------
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
 
 
 # -----------------------------------------------------------------------------
@@ -46,6 +94,20 @@ def _add_common_arguments(parser):
                         metavar='DIR',
                         help='location to which results will be written')
 
+    parser.add_argument('--timeout', type=float, default=300,
+                        metavar='SECONDS',
+                        help='time after which a test pass is killed '
+                             '(0 for no limit)')
+
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of tests to run concurrently')
+
+    parser.add_argument('--timings', type=str, metavar='FILE',
+                        help='file keeping the test durations and failures '
+                             'of previous runs, used to run recently failed '
+                             'and then the slowest tests first (default: '
+                             'timings.json in the result directory)')
+
 
 # -----------------------------------------------------------------------------
 def add_test_arguments(parser):
@@ -68,6 +130,11 @@ def add_source_tests_arguments(parser):
     parser.add_argument('-p', '--show-all', action='store_true',
                         help='show passed/skipped tests')
 
+    parser.add_argument('--changed-since', type=str, metavar='REV',
+                        help='only check the sources that changed since the '
+                             'git revision REV (all sources if the config '
+                             'changed)')
+
 
 # -----------------------------------------------------------------------------
 def add_format_tests_arguments(parser):
@@ -83,6 +150,42 @@ def add_format_tests_arguments(parser):
                         default=all_tests,
                         help='test(s) to run (default all)')
 
+    parser.add_argument('--changed-since', type=str, metavar='REV',
+                        help='only run the tests using a config, input or '
+                             'expected file that changed since the git '
+                             'revision REV (all tests if the sources of '
+                             'uncrustify changed)')
+
+    parser.add_argument('--coverage-index', type=str, metavar='FILE',
+                        help='with --changed-since, only run the tests that '
+                             'executed a changed function of src/*.cpp, '
+                             'according to this coverage index')
+
+    parser.add_argument('--write-coverage-index', type=str, metavar='FILE',
+                        help='run the tests against a gcov instrumented '
+                             'executable and write the index of the '
+                             'functions each test executes to FILE')
+
+    parser.add_argument('--gcov', type=str, default='gcov', metavar='PATH',
+                        help='gcov executable matching the compiler of the '
+                             'instrumented executable')
+
+    parser.add_argument('--shard', type=_shard_type, metavar='I/N',
+                        help='only run the I-th of N shards of the tests; '
+                             'the shards are balanced using the --timings '
+                             'file if given (which is then only read), or '
+                             'by a hash of the test names')
+
+    parser.add_argument('--write-results', type=str, metavar='FILE',
+                        help='write the outcome and timing of each test to '
+                             'FILE, to be combined by merge_test_results.py '
+                             '(default with --shard: shard-I-of-N.json in '
+                             'the result directory)')
+
+    parser.add_argument('--junit', type=str, metavar='FILE',
+                        help='write the outcome, duration and output of '
+                             'each test to FILE as a JUnit XML report')
+
     # Arguments for generating the CTest script; users should not use these
     # directly
     parser.add_argument("--write-ctest", type=str, help=argparse.SUPPRESS)
@@ -90,6 +193,16 @@ def add_format_tests_arguments(parser):
     parser.add_argument("--python", type=str, help=argparse.SUPPRESS)
 
 
+# -----------------------------------------------------------------------------
+def _shard_type(s):
+    try:
+        parse_shard(s)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'expected I/N, with 1 <= I <= N: {!r}'.format(s))
+    return s
+
+
 # -----------------------------------------------------------------------------
 def parse_args(parser):
     args = parser.parse_args()
@@ -120,41 +233,106 @@ def parse_args(parser):
 
 
 # -----------------------------------------------------------------------------
-def run_tests(tests, args, selector=None):
-    pass_count = 0
-    fail_count = 0
-    mismatch_count = 0
-    unstable_count = 0
-    unexpectedly_passing_count = 0
+def _run_test(test, args, output=None):
+    if output is not None:
+        output.start()
+
+    start = time.time()
+    try:
+        test.run(args)
+        outcome = 'passing'
+    except UnstableFailure:
+        outcome = 'unstable'
+    except MismatchFailure:
+        outcome = 'mismatch'
+    except UnexpectedlyPassingFailure:
+        outcome = 'xpass'
+    except TimeoutFailure:
+        outcome = 'timeout'
+    except Failure:
+        outcome = 'failing'
+    finally:
+        text = output.stop() if output is not None else ''
+
+    return test, outcome, time.time() - start, text
+
+
+# -----------------------------------------------------------------------------
+def count_outcomes(records):
+    counts = {
+        'passing': 0,
+        'failing': 0,
+        'mismatch': 0,
+        'unstable': 0,
+        'xpass': 0,
+        'timeout': 0
+    }
+    for record in records:
+        counts[record['outcome']] += 1
+    return counts
+
 
+# -----------------------------------------------------------------------------
+def run_tests(tests, args, selector=None, results=None):
+    # Returns the number of tests per outcome; if results is a list, a record
+    # of each test run (its name, outcome, duration, the duration of each of
+    # its passes and its output) is appended to it
+    records = []
+
+    selected = []
     for test in tests:
         if selector is not None and not selector.test(test.test_name):
             if args.show_all:
                 printc("SKIPPED: ", test.test_name, **SKIP_ATTRS)
             continue
+        selected.append(test)
+
+    timings = Timings(args.timings or
+                      os.path.join(args.result_dir, 'timings.json'))
+    selected = timings.order(selected)
+
+    # The output of each test is collected, to be printed in one piece once
+    # the test is done and kept in its record
+    output = _ThreadOutput(sys.stdout)
+    sys.stdout = output
+
+    jobs = max(1, min(args.jobs, len(selected)))
+    if jobs == 1:
+        outcomes = (_run_test(test, args, output) for test in selected)
+        pool = None
+    else:
+        # Tests are run by threads, which mostly wait for uncrustify
+        pool = ThreadPool(jobs)
+        outcomes = pool.imap_unordered(
+            lambda test: _run_test(test, args, output), selected)
 
-        try:
-            test.run(args)
-            if args.show_all:
-                outcome = 'XFAILED' if test.test_xfail else 'PASSED'
-                printc('{}: '.format(outcome), test.test_name, **PASS_ATTRS)
-            pass_count += 1
-        except UnstableFailure:
-            unstable_count += 1
-        except MismatchFailure:
-            mismatch_count += 1
-        except UnexpectedlyPassingFailure:
-            unexpectedly_passing_count += 1
-        except Failure:
-            fail_count += 1
-
-    return {
-        'passing': pass_count,
-        'failing': fail_count,
-        'mismatch': mismatch_count,
-        'unstable': unstable_count,
-        'xpass': unexpectedly_passing_count
-    }
+    try:
+        for test, outcome, duration, text in outcomes:
+            if text:
+                sys.stdout.write(text)
+            if outcome == 'passing' and args.show_all:
+                status = 'XFAILED' if test.test_xfail else 'PASSED'
+                printc('{}: '.format(status), test.test_name, **PASS_ATTRS)
+            sys.stdout.flush()
+
+            records.append({
+                'name': test.test_name,
+                'outcome': outcome,
+                'duration': duration,
+                'passes': getattr(test, 'pass_durations', [duration]),
+                'output': text,
+            })
+            timings.record(test.test_name, duration, outcome != 'passing')
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        sys.stdout = output.stream
+        timings.save()
+
+    if results is not None:
+        results += records
+    return count_outcomes(records)
 
 
 # -----------------------------------------------------------------------------
@@ -172,6 +350,8 @@ def report(counts):
     if counts['unstable'] > 0:
         printc('{unstable} tests were unstable'.format(**counts),
                **FAIL_ATTRS)
+    if counts['timeout'] > 0:
+        printc('{timeout} tests timed out'.format(**counts), **FAIL_ATTRS)
     if counts['xpass'] > 0:
         printc('{xpass} tests passed but were expected to fail'
             .format(**counts), **FAIL_ATTRS)